@@ -1,9 +1,15 @@
 import pygame
 import random
 import math
+import itertools
 from abc import ABC, abstractmethod
 import copy
 
+try:
+    import numpy as np
+except ImportError:  # NumPy нужен только для пакетной проверки столкновений (PlayingState.batch_collisions)
+    np = None
+
 # Инициализация Pygame
 pygame.init()
 
@@ -61,6 +67,53 @@ class ZigZagMovement(MovementStrategy):
         entity.x = max(0, min(entity.x, WIDTH - entity.rect.width))  # Ограничение по границам
         entity.update_rect()
 
+# Пакетное AABB-ядро: матрица пересечений пуль (строки) с врагами (столбцы).
+# Прямоугольники передаются массивами формы (n, 4): x, y, width, height - как у pygame.Rect
+def batch_overlaps(bullet_rects, enemy_rects):
+    bx, by, bw, bh = bullet_rects.T
+    ex, ey, ew, eh = enemy_rects.T
+    return ((bx[:, None] < (ex + ew)[None, :]) & ((bx + bw)[:, None] > ex[None, :]) &
+            (by[:, None] < (ey + eh)[None, :]) & ((by + bh)[:, None] > ey[None, :]) &
+            ((bw > 0) & (bh > 0))[:, None] & ((ew > 0) & (eh > 0))[None, :])
+
+# Разрешение попаданий пакетно: каждая пуля поражает первого живого врага, которого касается.
+# За раунд все пули выбирают цели одновременно; враг принимает столько пуль (в порядке пуль), сколько
+# выдерживает его hp. Все пули до первой отвергнутой разрешены окончательно, остальные пересчитываются
+# в следующем раунде. Раундов столько, сколько раз пули «перебивают» уже убитого врага.
+# Возвращает пары (индекс пули, индекс врага) в порядке пуль, как при последовательной проверке
+def resolve_bullet_hits(bullet_rects, enemy_rects, enemy_hp, damage):
+    overlaps = batch_overlaps(bullet_rects, enemy_rects)
+    hp = np.array(enemy_hp, dtype=float)
+    rows = np.flatnonzero(overlaps.any(axis=1))
+    hit_bullets = []
+    hit_enemies = []
+    while len(rows):
+        alive = overlaps[rows] & (hp > 0)[None, :]
+        touching = alive.any(axis=1)
+        rows = rows[touching]
+        if not len(rows):
+            break
+        targets = alive[touching].argmax(axis=1)
+        # Номер пули среди пуль с той же целью (в порядке пуль)
+        order = np.argsort(targets, kind='stable')
+        sorted_targets = targets[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_targets[1:] != sorted_targets[:-1]])
+        group_size = np.diff(np.r_[group_start, len(targets)])
+        rank = np.empty(len(targets), dtype=np.int64)
+        rank[order] = np.arange(len(targets)) - np.repeat(group_start, group_size)
+        accepted = rank < np.ceil(hp[targets] / damage)
+        cut = len(rows) if accepted.all() else int(np.argmin(accepted))
+        hit_bullets.append(rows[:cut])
+        hit_enemies.append(targets[:cut])
+        np.subtract.at(hp, targets[:cut], damage)
+        rows = rows[cut:]
+    if not hit_bullets:
+        return []
+    return list(zip(np.concatenate(hit_bullets).tolist(), np.concatenate(hit_enemies).tolist()))
+
+def rects_array(objs):
+    return np.fromiter(itertools.chain.from_iterable(obj.rect for obj in objs), dtype=np.int64).reshape(-1, 4)
+
 # Класс уведомлений
 class Notification:
     def __init__(self, text, x, y, duration, color=(255, 255, 255)):
@@ -186,6 +239,10 @@ class MenuState(GameState):
         screen.blit(start_text, start_rect)
 
 class PlayingState(GameState):
+    # Переключатель пакетной проверки столкновений пуль с врагами (требует NumPy).
+    # Выгоден только при тысячах врагов: на обычных количествах цена вызовов NumPy выше перебора
+    batch_collisions = False
+
     def __init__(self):
         self.pause_button = pygame.Rect(WIDTH - 110, 10, 100, 40)
         self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
@@ -258,30 +315,19 @@ class PlayingState(GameState):
 
         facade.game_state['time'] += 1
 
-        for bullet in facade.game_state['cowboy'].bullets[:]:
-            bullet.update()
-            if bullet.y < 0:
-                facade.game_state['cowboy'].bullets.remove(bullet)
-            else:
-                for wave in facade.game_state['enemies'].children[:]:
-                    for enemy in wave.children[:]:
-                        if bullet.rect.colliderect(enemy.rect):
-                            enemy.hp -= 1 * facade.game_state['cowboy'].damage_boost
-                            facade.game_state['cowboy'].bullets.remove(bullet)
-                            if enemy.hp <= 0:
-                                wave.remove(enemy)
-                                facade.notify("enemy_defeated", {"score_value": 10})
-                                base_drop_chance = 0.1
-                                time_factor = min(0.4, (facade.game_state['time'] / 60) * 0.01)
-                                drop_chance = base_drop_chance + time_factor
-                                if random.random() < drop_chance:
-                                    if random.random() < 0.5:
-                                        booster = facade.speed_booster_factory.create_booster(enemy.x, enemy.y)
-                                        facade.game_state['boosters'].add(booster)
-                                    else:
-                                        booster = facade.heal_factory.create_booster(enemy.x, enemy.y)
-                                        facade.game_state['boosters'].add(booster)
-                            break
+        if self.batch_collisions:
+            self._update_bullets_batch(facade)
+        else:
+            for bullet in facade.game_state['cowboy'].bullets[:]:
+                bullet.update()
+                if bullet.y < 0:
+                    facade.game_state['cowboy'].bullets.remove(bullet)
+                else:
+                    for wave in facade.game_state['enemies'].children[:]:
+                        for enemy in wave.children[:]:
+                            if bullet.rect.colliderect(enemy.rect):
+                                self._hit_enemy(facade, bullet, enemy, wave)
+                                break
 
         facade.game_state['enemies'].update()
         for wave in facade.game_state['enemies'].children[:]:
@@ -315,6 +361,44 @@ class PlayingState(GameState):
             if notification.duration <= 0:
                 facade.notifications.remove(notification)
 
+    def _hit_enemy(self, facade, bullet, enemy, wave):
+        enemy.hp -= 1 * facade.game_state['cowboy'].damage_boost
+        facade.game_state['cowboy'].bullets.remove(bullet)
+        if enemy.hp <= 0:
+            wave.remove(enemy)
+            facade.notify("enemy_defeated", {"score_value": 10})
+            base_drop_chance = 0.1
+            time_factor = min(0.4, (facade.game_state['time'] / 60) * 0.01)
+            drop_chance = base_drop_chance + time_factor
+            if random.random() < drop_chance:
+                if random.random() < 0.5:
+                    booster = facade.speed_booster_factory.create_booster(enemy.x, enemy.y)
+                    facade.game_state['boosters'].add(booster)
+                else:
+                    booster = facade.heal_factory.create_booster(enemy.x, enemy.y)
+                    facade.game_state['boosters'].add(booster)
+
+    # Пули двигаются все сразу, затем попадания разрешаются пакетным ядром NumPy
+    def _update_bullets_batch(self, facade):
+        bullets = facade.game_state['cowboy'].bullets
+        for bullet in bullets[:]:
+            bullet.update()
+            if bullet.y < 0:
+                bullets.remove(bullet)
+        enemies = []
+        waves = []
+        for wave in facade.game_state['enemies'].children:
+            enemies.extend(wave.children)
+            waves.extend([wave] * len(wave.children))
+        if not bullets or not enemies:
+            return
+        alive_bullets = bullets[:]
+        hits = resolve_bullet_hits(rects_array(alive_bullets), rects_array(enemies),
+                                   [enemy.hp for enemy in enemies],
+                                   1 * facade.game_state['cowboy'].damage_boost)
+        for b, e in hits:
+            self._hit_enemy(facade, alive_bullets[b], enemies[e], waves[e])
+
     def draw(self, facade, screen):
         screen.fill((135, 206, 235))
 
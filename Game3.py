@@ -1,8 +1,21 @@
 import pygame
 import random
+import sys
 import math
+import itertools
+from array import array
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 import copy
+import json
+import struct
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy нужен только для массивного хранилища сущностей (EntityStore)
+    np = None
 
 # Инициализация Pygame
 pygame.init()
@@ -10,10 +23,24 @@ pygame.init()
 # Константы
 WIDTH, HEIGHT = 800, 600
 FPS = 60
-
-# Экран
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Cowboy Shooter")
+# Частота симуляции не зависит от частоты кадров: FPS ограничивает только отрисовку
+TICK_RATE = 60
+MAX_CATCH_UP_TICKS = 5
+COMMAND_HISTORY_DEPTH = 1024
+MAX_NOTIFICATIONS = 8
+PROFILER_DEPTH = 600
+# События, которые в отложенном режиме шины сливаются в одно за тик, и их аддитивные (суммируемые) поля
+AGGREGATED_EVENTS = {"enemy_defeated": ("score_value",)}
+# Враг удаляется, когда его rect целиком выходит за поле дальше этого запаса (в пикселях)
+OFFSCREEN_MARGIN = 128
+# Порог живых сущностей (враги + пули игрока), с которого SpatialHash обгоняет полный перебор
+SPATIAL_HASH_MIN_ENTITIES = 2000
+PROFILER_OVERLAY_REFRESH = 30
+BACKGROUND_COLOR = (135, 206, 235)
+# Доля экрана, после которой рендерер грязных прямоугольников переходит на полный flip
+DIRTY_RECT_FULL_FLIP_RATIO = 0.5
+
+# Часы игрового цикла (окно создаётся в main(), чтобы модуль можно было импортировать без дисплея)
 clock = pygame.time.Clock()
 
 
@@ -23,18 +50,42 @@ class MovementStrategy(ABC):
     def move(self, entity, time=None):
         pass
 
+    # Пакетное ядро: двигает все сущности EntityStore с индексами idx за один векторный вызов
+    @abstractmethod
+    def move_batch(self, store, idx, time=None):
+        pass
+
+    @staticmethod
+    def _speed_up_batch(store, idx, time):
+        if time:
+            base_speed = store.base_speed[idx]
+            speed_increase = np.minimum(math.log1p(time / 60) * 0.25, store.max_speed[idx] - base_speed)
+            store.speed[idx] = base_speed + speed_increase
+
 
-# Concrete Strategy for Linear Movement (used by Bandit)
+# Concrete Strategy for Linear Movement (used by Bandit).
+# rng - источник случайности для дрожания (random.Random или модуль random)
 class LinearMovementStrategy(MovementStrategy):
+    def __init__(self, rng=random):
+        self.rng = rng
+
     def move(self, entity, time=None):
         if time:
             speed_increase = min(math.log1p(time / 60) * 0.25, entity.max_speed - entity.base_speed)
             entity.speed = entity.base_speed + speed_increase
         entity.y += entity.speed
-        if random.random() < 0.01:
-            entity.x += random.choice([-entity.speed, entity.speed])
+        if self.rng.random() < 0.01:
+            entity.x += self.rng.choice([-entity.speed, entity.speed])
         entity.update_rect()
 
+    def move_batch(self, store, idx, time=None):
+        self._speed_up_batch(store, idx, time)
+        speed = store.speed[idx]
+        store.y[idx] += speed
+        jitter = store.rng.random(len(idx)) < 0.01
+        direction = np.where(store.rng.random(len(idx)) < 0.5, -1.0, 1.0)
+        store.x[idx] += np.where(jitter, direction * speed, 0.0)
+
 
 # Concrete Strategy for Sinusoidal Movement (used by Eagle)
 class SinusoidalMovementStrategy(MovementStrategy):
@@ -47,6 +98,13 @@ class SinusoidalMovementStrategy(MovementStrategy):
         entity.angle += 0.1
         entity.update_rect()
 
+    def move_batch(self, store, idx, time=None):
+        self._speed_up_batch(store, idx, time)
+        speed = store.speed[idx]
+        store.y[idx] += np.sin(store.angle[idx]) * speed
+        store.x[idx] += speed
+        store.angle[idx] += 0.1
+
 
 # Concrete Strategy for ZigZag Movement (used by Bandit with 30% chance)
 class ZigZagMovementStrategy(MovementStrategy):
@@ -59,6 +117,13 @@ class ZigZagMovementStrategy(MovementStrategy):
         entity.angle += 0.0333  # Reduced from 0.1 to 0.0333 to make horizontal deviations 3 times longer
         entity.update_rect()
 
+    def move_batch(self, store, idx, time=None):
+        self._speed_up_batch(store, idx, time)
+        speed = store.speed[idx]
+        store.y[idx] += speed
+        store.x[idx] += np.cos(store.angle[idx]) * speed * 1
+        store.angle[idx] += 0.0333
+
 
 # Mediator Interface
 class GameObjectMediator(ABC):
@@ -71,29 +136,245 @@ class GameObjectMediator(ABC):
         pass
 
 
+# Индекс широкой фазы: полный перебор (эталонное поведение для сравнения).
+# Перебор идёт в Rect.collidelistall по списку rect'ов в порядке вставки; удалённые объекты отсеиваются по entries
+class BruteForceIndex:
+    def __init__(self):
+        self.entries = {}
+        self.objs = []
+        self.rects = []
+
+    def clear(self):
+        self.entries.clear()
+        self.objs.clear()
+        self.rects.clear()
+
+    def insert(self, obj, owner=None):
+        self.entries[obj] = (len(self.entries), owner)
+        self.objs.append(obj)
+        self.rects.append(obj.rect)
+
+    def insert_all(self, objs, owner=None):
+        for obj in objs:
+            self.insert(obj, owner)
+
+    def remove(self, obj):
+        self.entries.pop(obj, None)
+
+    def query(self, rect):
+        objs = self.objs
+        entries = self.entries
+        hits = []
+        for i in rect.collidelistall(self.rects):
+            entry = entries.get(objs[i])
+            if entry is not None:
+                hits.append((objs[i], entry[1]))
+        return hits
+
+
+# Индекс широкой фазы: равномерная сетка (spatial hash) по игровому полю.
+# Объект хранится в ячейке своего левого верхнего угла, запрос расширяется на максимальный размер объекта.
+# query() возвращает пересекающиеся объекты в порядке вставки, как при полном переборе
+class SpatialHash(BruteForceIndex):
+    def __init__(self, cell_size=64):
+        super().__init__()
+        self.cell_size = cell_size
+        self.cells = {}
+        self.max_width = 0
+        self.max_height = 0
+        self._counter = 0
+
+    def clear(self):
+        super().clear()
+        self.cells.clear()
+        self.max_width = 0
+        self.max_height = 0
+        self._counter = 0
+
+    def insert(self, obj, owner=None):
+        self.insert_all((obj,), owner)
+
+    def insert_all(self, objs, owner=None):
+        size = self.cell_size
+        cells = self.cells
+        entries = self.entries
+        counter = self._counter
+        max_width = self.max_width
+        max_height = self.max_height
+        for obj in objs:
+            rect = obj.rect
+            entries[obj] = (counter, owner)
+            counter += 1
+            if rect.width > max_width:
+                max_width = rect.width
+            if rect.height > max_height:
+                max_height = rect.height
+            key = (rect.x // size, rect.y // size)
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [obj]
+            else:
+                cell.append(obj)
+        self._counter = counter
+        self.max_width = max_width
+        self.max_height = max_height
+
+    def query(self, rect):
+        size = self.cell_size
+        cells = self.cells
+        entries = self.entries
+        hits = []
+        for cx in range((rect.left - self.max_width) // size, (rect.right - 1) // size + 1):
+            for cy in range((rect.top - self.max_height) // size, (rect.bottom - 1) // size + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    for obj in cell:
+                        if obj in entries and obj.rect.colliderect(rect):
+                            hits.append(obj)
+        if len(hits) > 1:
+            hits.sort(key=lambda obj: entries[obj][0])
+        return [(obj, entries[obj][1]) for obj in hits]
+
+
+# Пакетное AABB-ядро: матрица пересечений пуль (строки) с врагами (столбцы).
+# Прямоугольники передаются массивами формы (n, 4): x, y, width, height - как у pygame.Rect
+def batch_overlaps(bullet_rects, enemy_rects):
+    bx, by, bw, bh = bullet_rects.T
+    ex, ey, ew, eh = enemy_rects.T
+    return ((bx[:, None] < (ex + ew)[None, :]) & ((bx + bw)[:, None] > ex[None, :]) &
+            (by[:, None] < (ey + eh)[None, :]) & ((by + bh)[:, None] > ey[None, :]) &
+            ((bw > 0) & (bh > 0))[:, None] & ((ew > 0) & (eh > 0))[None, :])
+
+
+# Разрешение попаданий пакетно: каждая пуля поражает первого живого врага, которого касается.
+# За раунд все пули выбирают цели одновременно; враг принимает столько пуль (в порядке пуль), сколько
+# выдерживает его hp. Все пули до первой отвергнутой разрешены окончательно, остальные пересчитываются
+# в следующем раунде. Раундов столько, сколько раз пули «перебивают» уже убитого врага.
+# Возвращает пары (индекс пули, индекс врага) в порядке пуль, как при последовательной проверке
+def resolve_bullet_hits(bullet_rects, enemy_rects, enemy_hp, damage):
+    overlaps = batch_overlaps(bullet_rects, enemy_rects)
+    hp = np.array(enemy_hp, dtype=float)
+    rows = np.flatnonzero(overlaps.any(axis=1))
+    hit_bullets = []
+    hit_enemies = []
+    while len(rows):
+        alive = overlaps[rows] & (hp > 0)[None, :]
+        touching = alive.any(axis=1)
+        rows = rows[touching]
+        if not len(rows):
+            break
+        targets = alive[touching].argmax(axis=1)
+        # Номер пули среди пуль с той же целью (в порядке пуль)
+        order = np.argsort(targets, kind='stable')
+        sorted_targets = targets[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_targets[1:] != sorted_targets[:-1]])
+        group_size = np.diff(np.r_[group_start, len(targets)])
+        rank = np.empty(len(targets), dtype=np.int64)
+        rank[order] = np.arange(len(targets)) - np.repeat(group_start, group_size)
+        accepted = rank < np.ceil(hp[targets] / damage)
+        cut = len(rows) if accepted.all() else int(np.argmin(accepted))
+        hit_bullets.append(rows[:cut])
+        hit_enemies.append(targets[:cut])
+        np.subtract.at(hp, targets[:cut], damage)
+        rows = rows[cut:]
+    if not hit_bullets:
+        return []
+    return list(zip(np.concatenate(hit_bullets).tolist(), np.concatenate(hit_enemies).tolist()))
+
+
+def rects_array(objs):
+    return np.fromiter(itertools.chain.from_iterable(obj.rect for obj in objs), dtype=np.int64).reshape(-1, 4)
+
+
 # Concrete Mediator
 class GameObjectMediatorImpl(GameObjectMediator):
+    # index_factory=None - индекс врагов выбирается каждый тик по числу живых сущностей:
+    # полный перебор до SPATIAL_HASH_MIN_ENTITIES, выше - SpatialHash.
+    # entity_store=True - враги двигаются пакетно через EntityStore (для стресс-сценариев).
+    # batch_collisions=True - попадания пуль и касания ковбоя считаются ядром NumPy. По bench_collisions
+    # оно медленнее индекса при 50 и 500 сущностях (фиксированная цена вызовов NumPy) и лишь догоняет
+    # его к 5000, поэтому по умолчанию выключено
+    def __init__(self, index_factory=None, batch_collisions=False, entity_store=False):
+        if batch_collisions and np is None:
+            raise RuntimeError("batch_collisions requires NumPy")
+        if entity_store and np is None:
+            raise RuntimeError("entity_store requires NumPy")
+        self.entity_store = entity_store
+        self.store = None
+        self.adaptive = index_factory is None
+        if self.adaptive:
+            self.brute_force_index = BruteForceIndex()
+            self.spatial_hash = SpatialHash()
+            self.enemy_index = self.brute_force_index
+            self.eagle_bullet_index = BruteForceIndex()
+        else:
+            self.enemy_index = index_factory()
+            self.eagle_bullet_index = index_factory()
+        self.batch_collisions = batch_collisions
+        self.batch_enemies = []
+        self.batch_waves = []
+        self.batch_rects = None
+        self.command_coalescer = CommandCoalescer()
+
+    def _select_enemy_index(self, facade):
+        if self.adaptive:
+            live = len(facade.game_state['cowboy'].bullets)
+            for wave in facade.game_state['enemies'].children:
+                live += len(wave.children)
+            self.enemy_index.clear()
+            self.enemy_index = (self.spatial_hash if live >= SPATIAL_HASH_MIN_ENTITIES
+                                else self.brute_force_index)
+        return self.enemy_index
+
+    # Попадания пуль через индекс широкой фазы. Генератор ленивый: убитый враг
+    # удаляется из индекса до проверки следующей пули
+    def _indexed_bullet_hits(self, facade):
+        for bullet in facade.game_state['cowboy'].bullets:
+            hits = self.enemy_index.query(bullet.rect)
+            if hits:
+                enemy, wave = hits[0]
+                yield bullet, enemy, wave
+
+    # Враги тика для пакетного режима: списки и массив rect'ов собираются один раз
+    # и служат и для попаданий пуль, и для касаний ковбоя
+    def _collect_enemies(self, facade):
+        enemies = []
+        waves = []
+        for wave in facade.game_state['enemies'].children:
+            enemies.extend(wave.children)
+            waves.extend([wave] * len(wave.children))
+        self.batch_enemies = enemies
+        self.batch_waves = waves
+        self.batch_rects = rects_array(enemies)
+
+    # Попадания пуль пакетным ядром NumPy
+    def _batch_bullet_hits(self, facade):
+        bullets = list(facade.game_state['cowboy'].bullets)
+        enemies = self.batch_enemies
+        if not bullets or not enemies:
+            return []
+        hits = resolve_bullet_hits(rects_array(bullets), self.batch_rects,
+                                   [enemy.hp for enemy in enemies],
+                                   1 * facade.game_state['cowboy'].damage_boost)
+        return [(bullets[b], enemies[e], self.batch_waves[e]) for b, e in hits]
+
+    # Враги, которых касается ковбой, в порядке обхода волн; убитые пулями в этом тике пропускаются
+    def _enemy_contacts(self, cowboy):
+        if not self.batch_collisions:
+            return self.enemy_index.query(cowboy.rect)
+        if not self.batch_enemies:
+            return []
+        enemies = self.batch_enemies
+        waves = self.batch_waves
+        touching = np.flatnonzero(batch_overlaps(rects_array((cowboy,)), self.batch_rects)[0])
+        return [(enemies[i], waves[i]) for i in touching.tolist() if enemies[i] in waves[i]]
+
     def update_objects(self, facade, keys, wasd_controls):
         cowboy = facade.game_state['cowboy']
+        rng = facade.rng
 
-        # Handle cowboy movement
-        if keys[pygame.K_LEFT]:
-            cowboy.execute_command(MoveCommand(cowboy, -1, 0))
-        if keys[pygame.K_RIGHT]:
-            cowboy.execute_command(MoveCommand(cowboy, 1, 0))
-        if keys[pygame.K_UP]:
-            cowboy.execute_command(MoveCommand(cowboy, 0, -1))
-        if keys[pygame.K_DOWN]:
-            cowboy.execute_command(MoveCommand(cowboy, 0, 1))
-
-        if wasd_controls['move_x'] != 0 or wasd_controls['move_y'] != 0:
-            cowboy.execute_command(MoveCommand(cowboy, wasd_controls['move_x'], wasd_controls['move_y']))
-
-        if keys[pygame.K_SPACE]:
-            cowboy.execute_command(ShootCommand(cowboy))
-
-        if keys[pygame.K_z]:
-            cowboy.undo_last_command()
+        # Handle cowboy movement, shooting and undo
+        self.command_coalescer.apply(cowboy, keys, wasd_controls)
 
         cowboy.update_boost()
 
@@ -111,103 +392,150 @@ class GameObjectMediatorImpl(GameObjectMediator):
                 facade.game_state['waves'])
             current_wave = facade.game_state['waves'][facade.game_state['current_wave']]
 
-            if random.random() < 0.6:
+            if rng.random() < 0.6:
                 max_bandits = 4
                 min_bandits = 1
                 bandit_count = min_bandits + int(wave_factor * (max_bandits - min_bandits))
                 segment_width = WIDTH // max_bandits
                 for i in range(bandit_count):
                     base_x = i * segment_width + segment_width // 2
-                    spawn_x = base_x + random.randint(-segment_width // 4, segment_width // 4)
+                    spawn_x = base_x + rng.randint(-segment_width // 4, segment_width // 4)
                     spawn_x = max(0, min(spawn_x, WIDTH - 32))
                     enemy = facade.bandit_factory.create_enemy(spawn_x)
-                    current_wave.add(enemy)
+                    facade.lifecycle.spawn(current_wave, enemy)
             else:
                 enemy = facade.eagle_factory.create_enemy()
-                current_wave.add(enemy)
+                facade.lifecycle.spawn(current_wave, enemy)
 
         facade.game_state['time'] += 1
 
         # Update all game objects
         for bullet in facade.game_state['cowboy'].bullets:
             bullet.update()
-        facade.game_state['enemies'].update()
+        if self.entity_store:
+            self._update_enemies_batched(facade)
+        else:
+            facade.game_state['enemies'].update()
+        facade.lifecycle.cull(facade.game_state['waves'])
         for bullet in facade.game_state['eagle_bullets']:
             bullet.update()
         facade.game_state['boosters'].update()
         for notification in facade.notifications:
             notification.update()
 
+    # Движение врагов пакетными ядрами стратегий; генератор NumPy хранилища засевается из RNG движка
+    def _update_enemies_batched(self, facade):
+        if self.store is None:
+            self.store = EntityStore(seed=facade.rng.getrandbits(64))
+        store = self.store
+        waves = facade.game_state['waves']
+        store.track(waves)
+        store.update()
+        store.sync()
+        for entity in store.entities:
+            if entity.__class__ is Eagle:
+                entity.shoot_timer -= 1
+
     def handle_collisions(self, facade):
         cowboy = facade.game_state['cowboy']
+        rng = facade.rng
+
+        enemy_index = self._select_enemy_index(facade)
+        enemy_index.clear()
+        if self.batch_collisions:
+            self._collect_enemies(facade)
+        else:
+            for wave in facade.game_state['enemies'].children:
+                enemy_index.insert_all(wave.children, wave)
 
         # Handle cowboy bullets
-        for bullet in cowboy.bullets[:]:
-            if bullet.y < 0:
+        with cowboy.bullets.deferred():
+            for bullet in cowboy.bullets:
+                if bullet.y < 0:
+                    cowboy.bullets.remove(bullet)
+                    facade.bullet_factory.release_bullet(bullet)
+        bullet_hits = self._batch_bullet_hits if self.batch_collisions else self._indexed_bullet_hits
+        with cowboy.bullets.deferred():
+            for bullet, enemy, wave in bullet_hits(facade):
+                enemy.hp -= 1 * cowboy.damage_boost
                 cowboy.bullets.remove(bullet)
-                continue
-            for wave in facade.game_state['enemies'].children[:]:
-                for enemy in wave.children[:]:
-                    if bullet.rect.colliderect(enemy.rect):
-                        enemy.hp -= 1 * cowboy.damage_boost
-                        cowboy.bullets.remove(bullet)
-                        if enemy.hp <= 0:
-                            wave.remove(enemy)
-                            facade.notify("enemy_defeated", {"score_value": 10})
-                            base_drop_chance = 0.1
-                            time_factor = min(0.4, (facade.game_state['time'] / 60) * 0.01)
-                            drop_chance = base_drop_chance + time_factor
-                            if random.random() < drop_chance:
-                                if random.random() < 0.5:
-                                    booster = facade.speed_booster_factory.create_booster(enemy.x, enemy.y)
-                                    facade.game_state['boosters'].add(booster)
-                                else:
-                                    booster = facade.heal_factory.create_booster(enemy.x, enemy.y)
-                                    facade.game_state['boosters'].add(booster)
-                        break
+                facade.bullet_factory.release_bullet(bullet)
+                if enemy.hp <= 0:
+                    facade.lifecycle.despawn(wave, enemy)
+                    enemy_index.remove(enemy)
+                    facade.event_bus.publish("enemy_defeated", {"score_value": 10})
+                    base_drop_chance = 0.1
+                    time_factor = min(0.4, (facade.game_state['time'] / 60) * 0.01)
+                    drop_chance = base_drop_chance + time_factor
+                    if rng.random() < drop_chance:
+                        if rng.random() < 0.5:
+                            booster = facade.speed_booster_factory.create_booster(enemy.x, enemy.y)
+                        else:
+                            booster = facade.heal_factory.create_booster(enemy.x, enemy.y)
+                        facade.lifecycle.spawn(facade.game_state['boosters'], booster)
 
         # Handle enemy interactions
-        for wave in facade.game_state['enemies'].children[:]:
-            for enemy in wave.children[:]:
+        for wave in facade.game_state['enemies'].children:
+            for enemy in wave.children:
                 if isinstance(enemy, Eagle):
                     bullet = enemy.shoot()
                     if bullet:
-                        facade.game_state['eagle_bullets'].append(bullet)
-                if enemy.rect.colliderect(cowboy.rect):
-                    cowboy.set_health(cowboy.hp - 1)
-                    wave.remove(enemy)
+                        facade.lifecycle.spawn(facade.game_state['eagle_bullets'], bullet)
+        for enemy, wave in self._enemy_contacts(cowboy):
+            cowboy.set_health(cowboy.hp - 1)
+            facade.lifecycle.despawn(wave, enemy)
+            enemy_index.remove(enemy)
 
         # Handle eagle bullets
-        for bullet in facade.game_state['eagle_bullets'][:]:
-            if bullet.y > HEIGHT:
-                facade.game_state['eagle_bullets'].remove(bullet)
-            elif bullet.rect.colliderect(cowboy.rect):
-                cowboy.set_health(cowboy.hp - 1)
-                facade.game_state['eagle_bullets'].remove(bullet)
+        eagle_bullet_index = self.eagle_bullet_index
+        eagle_bullet_index.clear()
+        with facade.game_state['eagle_bullets'].deferred():
+            for bullet in facade.game_state['eagle_bullets']:
+                if bullet.y > HEIGHT:
+                    facade.lifecycle.despawn(facade.game_state['eagle_bullets'], bullet)
+                    facade.bullet_factory.release_bullet(bullet)
+                else:
+                    eagle_bullet_index.insert(bullet)
+        for bullet, _ in eagle_bullet_index.query(cowboy.rect):
+            cowboy.set_health(cowboy.hp - 1)
+            facade.lifecycle.despawn(facade.game_state['eagle_bullets'], bullet)
+            facade.bullet_factory.release_bullet(bullet)
 
         # Handle boosters
-        for booster in facade.game_state['boosters'].children[:]:
-            if cowboy.rect.colliderect(booster.rect):
-                booster.apply(cowboy)
-                facade.game_state['boosters'].remove(booster)
-            elif booster.y >= HEIGHT - 64:
-                facade.game_state['boosters'].remove(booster)
+        with facade.game_state['boosters'].deferred():
+            for booster in facade.game_state['boosters']:
+                if cowboy.rect.colliderect(booster.rect):
+                    booster.apply(cowboy)
+                    facade.lifecycle.despawn(facade.game_state['boosters'], booster)
+                    facade.release_booster(booster)
+                elif booster.y >= HEIGHT - 64:
+                    facade.lifecycle.despawn(facade.game_state['boosters'], booster)
+                    facade.release_booster(booster)
 
         # Handle notifications
-        for notification in facade.notifications[:]:
-            if notification.duration <= 0:
-                facade.notifications.remove(notification)
+        with facade.notifications.deferred():
+            for notification in facade.notifications:
+                if notification.duration <= 0:
+                    facade.notifications.remove(notification)
+                    facade.notification_pool.release(notification)
 
 
 # Класс для уведомлений
 class Notification:
+    __slots__ = ('text', 'x', 'y', 'duration', 'color', 'font', 'alpha', 'pooled')
+
     def __init__(self, text, x, y, duration, color=(255, 255, 255)):
+        self.pooled = False
+        self.font = ResourceManager().get_font("Arial", 20, bold=True)
+        self.reset(text, x, y, duration, color)
+
+    # Повторная инициализация уведомления, взятого из ObjectPool
+    def reset(self, text, x, y, duration, color=(255, 255, 255)):
         self.text = text
         self.x = x
         self.y = y
         self.duration = duration
         self.color = color
-        self.font = pygame.font.SysFont("Arial", 20, bold=True)
         self.alpha = 255
 
     def update(self):
@@ -217,17 +545,27 @@ class Notification:
 
     def draw(self, screen):
         if self.duration > 0:
-            surface = self.font.render(self.text, True, self.color)
+            # Поверхность общая для всех одинаковых надписей: прозрачность выставляется только на время blit
+            surface = ResourceManager().render_text(self.font, self.text, self.color)
             surface.set_alpha(self.alpha)
-            screen.blit(surface, (self.x, self.y))
+            rect = screen.blit(surface, (self.x, self.y))
+            surface.set_alpha(255)
+            return rect
+        return None
 
 
-# Абстрактный класс Observer
+# Абстрактный класс Observer: обработчики объявляются по типу события, update() выбирает
+# нужный без цепочки сравнений строк
 class Observer(ABC):
     @abstractmethod
-    def update(self, event_type, data):
+    def handlers(self):
         pass
 
+    def update(self, event_type, data):
+        handler = self.handlers().get(event_type)
+        if handler is not None:
+            handler(data)
+
 
 # Абстрактный класс Subject
 class Subject(ABC):
@@ -242,46 +580,215 @@ class Subject(ABC):
         if observer in self._observers:
             self._observers.remove(observer)
 
+    # Подписка с дескриптором: отмена через Subscription.cancel()
+    def subscribe(self, observer):
+        self.attach(observer)
+        return Subscription(self, observer)
+
     def notify(self, event_type, data):
         for observer in self._observers:
             observer.update(event_type, data)
 
 
+# Дескриптор подписки наблюдателя на субъект. Повторный cancel() ничего не делает
+class Subscription:
+    __slots__ = ('subject', 'observer')
+
+    def __init__(self, subject, observer):
+        self.subject = subject
+        self.observer = observer
+
+    def cancel(self):
+        if self.subject is not None:
+            self.subject.detach(self.observer)
+            self.subject = None
+            self.observer = None
+
+
 # Конкретные наблюдатели
 class ScoreObserver(Observer):
     def __init__(self, game_state):
         self.game_state = game_state
 
-    def update(self, event_type, data):
-        if event_type == "enemy_defeated":
-            self.game_state['score'] += data['score_value']
+    def handlers(self):
+        return {"enemy_defeated": self.on_enemy_defeated}
+
+    # При пакетной доставке score_value уже просуммирован по всем убитым за тик
+    def on_enemy_defeated(self, data):
+        self.game_state['score'] += data['score_value']
 
 
 class UIObserver(Observer):
     def __init__(self, facade):
         self.facade = facade
 
-    def update(self, event_type, data):
-        if event_type == "health_changed":
-            health = data['health']
-            text = f"Health: {health}" if health > 0 else "Game Over!"
-            color = (255, 0, 0) if health < self.facade.game_state['cowboy'].hp else (0, 255, 0)
-            self.facade.add_notification(text, self.facade.game_state['cowboy'].x,
-                                         self.facade.game_state['cowboy'].y - 20, 60, color)
-        elif event_type == "booster_collected":
-            self.facade.add_notification("Booster Collected!", self.facade.game_state['cowboy'].x,
-                                         self.facade.game_state['cowboy'].y - 20, 60, (0, 255, 0))
+    def handlers(self):
+        return {"health_changed": self.on_health_changed, "booster_collected": self.on_booster_collected}
+
+    def on_health_changed(self, data):
+        health = data['health']
+        text = f"Health: {health}" if health > 0 else "Game Over!"
+        color = (255, 0, 0) if health < self.facade.game_state['cowboy'].hp else (0, 255, 0)
+        self.facade.add_notification(text, self.facade.game_state['cowboy'].x,
+                                     self.facade.game_state['cowboy'].y - 20, 60, color)
+
+    def on_booster_collected(self, data):
+        self.facade.add_notification("Booster Collected!", self.facade.game_state['cowboy'].x,
+                                     self.facade.game_state['cowboy'].y - 20, 60, (0, 255, 0))
 
 
 class GameStateObserver(Observer):
     def __init__(self, facade):
         self.facade = facade
 
-    def update(self, event_type, data):
-        if event_type == "health_changed" and data['health'] <= 0:
+    def handlers(self):
+        return {"health_changed": self.on_health_changed}
+
+    def on_health_changed(self, data):
+        if data['health'] <= 0:
             self.facade.change_state(GameOverState(self.facade))
 
 
+# Шина событий: подписчики индексированы по типу события, publish вызывает только их.
+# SYNC - доставка сразу; DEFERRED - события копятся до flush() в конце тика, а события из
+# aggregate сливаются в одно за тик: объявленные аддитивные поля суммируются, остальные берутся
+# из последнего события, count - число исходных событий. aggregate - словарь {тип: аддитивные поля}
+# или просто перечень типов (тогда аддитивных полей нет).
+# Шина сама является наблюдателем и пересылает события субъектов, на которые подписана
+class EventBus:
+    SYNC = 'sync'
+    DEFERRED = 'deferred'
+
+    def __init__(self, mode=DEFERRED, aggregate=AGGREGATED_EVENTS):
+        self.mode = mode
+        if not isinstance(aggregate, dict):
+            aggregate = dict.fromkeys(aggregate, ())
+        self.aggregate = {event_type: frozenset(fields) for event_type, fields in aggregate.items()}
+        self.subscribers = {}
+        self.pending = []
+        self.aggregated = {}
+        self.delivered = 0
+
+    def subscribe(self, event_type, handler):
+        self.subscribers[event_type] = self.subscribers.get(event_type, ()) + (handler,)
+        return Subscription(self, (event_type, handler))
+
+    def subscribe_observer(self, observer):
+        return [self.subscribe(event_type, handler) for event_type, handler in observer.handlers().items()]
+
+    def detach(self, entry):
+        event_type, handler = entry
+        handlers = list(self.subscribers.get(event_type, ()))
+        if handler in handlers:
+            handlers.remove(handler)
+            self.subscribers[event_type] = tuple(handlers)
+
+    def subscriber_count(self):
+        return sum(len(handlers) for handlers in self.subscribers.values())
+
+    def publish(self, event_type, data):
+        if self.mode == self.SYNC:
+            self._deliver(event_type, data)
+        elif event_type in self.aggregate:
+            merged = self.aggregated.get(event_type)
+            if merged is None:
+                merged = self.aggregated[event_type] = dict(data, count=1)
+                self.pending.append((event_type, merged))
+            else:
+                additive = self.aggregate[event_type]
+                for key, value in data.items():
+                    merged[key] = merged.get(key, 0) + value if key in additive else value
+                merged['count'] += 1
+        else:
+            self.pending.append((event_type, data))
+
+    def update(self, event_type, data):
+        self.publish(event_type, data)
+
+    # Обработчики могут публиковать новые события - они доставляются в том же flush
+    def flush(self):
+        while self.pending:
+            pending, self.pending = self.pending, []
+            self.aggregated = {}
+            for event_type, data in pending:
+                self._deliver(event_type, data)
+
+    def clear(self):
+        self.pending = []
+        self.aggregated = {}
+
+    def _deliver(self, event_type, data):
+        for handler in self.subscribers.get(event_type, ()):
+            handler(data)
+        self.delivered += 1
+
+
+# HUD с грязными флагами, общий для PlayingState и PauseState. Каждое поле хранит значение,
+# по которому оно было отрисовано, и перерисовывается только когда это значение в game_state изменилось
+class HUD:
+    FIELDS = (
+        ('score', (10, 5)),
+        ('time', (10, 30)),
+        ('boost', (10, 55)),
+        ('wave', (10, 80)),
+    )
+
+    def __init__(self, font, hp_texture):
+        self.font = font
+        self.hp_texture = hp_texture
+        self.values = {}
+        self.sequences = {}
+        self.bounds = {}
+        self.renders = 0
+
+    @staticmethod
+    def field_value(name, game_state):
+        if name == 'score':
+            return game_state['score']
+        if name == 'time':
+            return game_state['time'] // 60
+        if name == 'boost':
+            cowboy = game_state['cowboy']
+            return cowboy.boost_duration // 60 if cowboy.boost_active else None
+        return game_state['current_wave'] + 1
+
+    @staticmethod
+    def field_text(name, value):
+        if name == 'score':
+            return f"Score: {value}", (0, 0, 0)
+        if name == 'time':
+            return f"Time: {value}", (0, 0, 0)
+        if name == 'boost':
+            return (f"Boost: {value}", (0, 255, 0)) if value is not None else ("Boost: 0", (0, 0, 0))
+        return f"Wave: {value}", (0, 0, 255)
+
+    # Поле собирается из глифов атласа; результат - готовая последовательность для Surface.blits
+    # и границы поля на экране
+    def render_field(self, name, value, position):
+        text, color = self.field_text(name, value)
+        self.renders += 1
+        atlas = ResourceManager().get_glyph_atlas(self.font, color)
+        return atlas.blit_sequence(text, position), pygame.Rect(position, atlas.size(text))
+
+    # Возвращает границы нарисованных полей и иконок здоровья
+    def draw(self, screen, game_state):
+        blits = []
+        for name, position in self.FIELDS:
+            value = self.field_value(name, game_state)
+            if name not in self.sequences or self.values[name] != value:
+                self.values[name] = value
+                self.sequences[name], self.bounds[name] = self.render_field(name, value, position)
+            blits.extend(self.sequences[name])
+        hp = game_state['cowboy'].hp
+        for i in range(hp):
+            blits.append((self.hp_texture, (10 + i * 45, 105)))
+        screen.blits(blits, doreturn=False)
+        rects = list(self.bounds.values())
+        if hp > 0:
+            rects.append(pygame.Rect(10, 105, (hp - 1) * 45 + self.hp_texture.get_width(), self.hp_texture.get_height()))
+        return rects
+
+
 # Абстрактный класс для игровых состояний
 class GameState(ABC):
     @abstractmethod
@@ -300,8 +807,8 @@ class GameState(ABC):
 # Состояние меню
 class MenuState(GameState):
     def __init__(self):
-        self.title_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
+        self.title_font = ResourceManager().get_font("Arial", 48, bold=True)
+        self.text_font = ResourceManager().get_font("Arial", 24, bold=True)
         self.start_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2, 200, 50)
 
     def handle_events(self, facade):
@@ -319,7 +826,7 @@ class MenuState(GameState):
         pass
 
     def draw(self, facade, screen):
-        screen.fill((135, 206, 235))
+        screen.fill(BACKGROUND_COLOR)
         title_text = self.title_font.render("Cowboy Shooter", True, (0, 0, 0))
         title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100))
         screen.blit(title_text, title_rect)
@@ -335,8 +842,7 @@ class MenuState(GameState):
 class PlayingState(GameState):
     def __init__(self):
         self.pause_button = pygame.Rect(WIDTH - 110, 10, 100, 40)
-        self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
-        self.mediator = GameObjectMediatorImpl()
+        self.text_font = ResourceManager().get_font("Arial", 24, bold=True)
 
     def handle_events(self, facade):
         for event in pygame.event.get():
@@ -345,58 +851,76 @@ class PlayingState(GameState):
             if event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
                 if self.pause_button.collidepoint(mouse_pos):
-                    facade.change_state(PauseState())
+                    self.pause(facade)
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
-                    facade.change_state(PauseState())
+                    self.pause(facade)
+                if event.key == pygame.K_F3:
+                    facade.profiler.toggle_overlay()
         return True
 
+    def pause(self, facade):
+        if facade.recorder is not None:
+            facade.recorder.mark_pause()
+        facade.change_state(PauseState())
+
     def update(self, facade):
-        keys = pygame.key.get_pressed()
+        profiler = facade.profiler
+        if facade.recorder is not None:
+            facade.recorder.record(facade.keyboard.get_pressed())
+        if not profiler.enabled:
+            keys = facade.keyboard.get_pressed()
+            wasd_controls = facade.wasd_input.get_controls()
+            facade.mediator.update_objects(facade, keys, wasd_controls)
+            facade.mediator.handle_collisions(facade)
+            facade.event_bus.flush()
+            return
+        start = perf_counter()
+        keys = facade.keyboard.get_pressed()
         wasd_controls = facade.wasd_input.get_controls()
-        self.mediator.update_objects(facade, keys, wasd_controls)
-        self.mediator.handle_collisions(facade)
+        read = perf_counter()
+        facade.mediator.update_objects(facade, keys, wasd_controls)
+        updated = perf_counter()
+        facade.mediator.handle_collisions(facade)
+        facade.event_bus.flush()
+        profiler.add('input', read - start)
+        profiler.add('update_objects', updated - read)
+        profiler.add('handle_collisions', perf_counter() - updated)
 
     def draw(self, facade, screen):
-        screen.fill((135, 206, 235))
-
-        score_text = facade.text_font.render(f"Score: {facade.game_state['score']}", True, (0, 0, 0))
-        time_text = facade.text_font.render(f"Time: {facade.game_state['time'] // 60}", True, (0, 0, 0))
-        boost_text = facade.text_font.render(f"Boost: {facade.game_state['cowboy'].boost_duration // 60}", True,
-                                             (0, 255, 0)) if facade.game_state[
-            'cowboy'].boost_active else facade.text_font.render("Boost: 0", True, (0, 0, 0))
-        wave_text = facade.text_font.render(f"Wave: {facade.game_state['current_wave'] + 1}", True, (0, 0, 255))
-        screen.blit(score_text, (10, 5))
-        screen.blit(time_text, (10, 30))
-        screen.blit(boost_text, (10, 55))
-        screen.blit(wave_text, (10, 80))
-
-        for i in range(facade.game_state['cowboy'].hp):
-            screen.blit(facade.hp_texture, (10 + i * 45, 105))
-
-        facade.game_state['cowboy'].draw(screen)
-        for bullet in facade.game_state['cowboy'].bullets:
-            bullet.draw(screen)
-        facade.game_state['enemies'].draw(screen)
-        facade.game_state['boosters'].draw(screen)
-        for bullet in facade.game_state['eagle_bullets']:
-            bullet.draw(screen)
-
-        for notification in facade.notifications:
-            notification.draw(screen)
+        screen.fill(BACKGROUND_COLOR)
+        self.draw_scene(facade, screen)
+
+    # Отрисовка кадра поверх уже подготовленного фона; возвращает границы всего нарисованного
+    def draw_scene(self, facade, screen):
+        rects = facade.hud.draw(screen, facade.game_state)
+
+        alpha = facade.render_alpha
+        rects.append(facade.game_state['cowboy'].draw(screen, alpha))
+        render_queue = facade.render_queue
+        render_queue.submit('player_bullets', facade.game_state['cowboy'].bullets, alpha)
+        render_queue.submit('enemies', facade.game_state['enemies'], alpha)
+        render_queue.submit('boosters', facade.game_state['boosters'], alpha)
+        render_queue.submit('eagle_bullets', facade.game_state['eagle_bullets'], alpha)
+        rects.extend(render_queue.flush(screen))
+        rects.extend(facade.notifications.draw(screen))
+        if facade.profiler.overlay:
+            rects.extend(facade.profiler.draw_overlay(screen, ResourceManager().get_font("Arial", 14, bold=True)))
 
         pygame.draw.rect(screen, (255, 165, 0), self.pause_button)
         pygame.draw.rect(screen, (0, 0, 0), self.pause_button, 2)
-        pause_text = self.text_font.render("Pause", True, (0, 0, 0))
+        pause_text = ResourceManager().render_text(self.text_font, "Pause", (0, 0, 0))
         pause_rect = pause_text.get_rect(center=self.pause_button.center)
         screen.blit(pause_text, pause_rect)
+        rects.append(self.pause_button)
+        return rects
 
 
 # Состояние паузы
 class PauseState(GameState):
     def __init__(self):
-        self.title_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
+        self.title_font = ResourceManager().get_font("Arial", 48, bold=True)
+        self.text_font = ResourceManager().get_font("Arial", 24, bold=True)
         self.resume_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2, 200, 50)
 
     def handle_events(self, facade):
@@ -416,28 +940,17 @@ class PauseState(GameState):
         pass
 
     def draw(self, facade, screen):
-        screen.fill((135, 206, 235))
-        score_text = facade.text_font.render(f"Score: {facade.game_state['score']}", True, (0, 0, 0))
-        time_text = facade.text_font.render(f"Time: {facade.game_state['time'] // 60}", True, (0, 0, 0))
-        boost_text = facade.text_font.render(f"Boost: {facade.game_state['cowboy'].boost_duration // 60}", True,
-                                             (0, 255, 0)) if facade.game_state[
-            'cowboy'].boost_active else facade.text_font.render("Boost: 0", True, (0, 0, 0))
-        wave_text = facade.text_font.render(f"Wave: {facade.game_state['current_wave'] + 1}", True, (0, 0, 255))
-        screen.blit(score_text, (10, 5))
-        screen.blit(time_text, (10, 30))
-        screen.blit(boost_text, (10, 55))
-        screen.blit(wave_text, (10, 80))
-
-        for i in range(facade.game_state['cowboy'].hp):
-            screen.blit(facade.hp_texture, (10 + i * 45, 105))
-
-        facade.game_state['cowboy'].draw(screen)
-        for bullet in facade.game_state['cowboy'].bullets:
-            bullet.draw(screen)
-        facade.game_state['enemies'].draw(screen)
-        facade.game_state['boosters'].draw(screen)
-        for bullet in facade.game_state['eagle_bullets']:
-            bullet.draw(screen)
+        screen.fill(BACKGROUND_COLOR)
+        facade.hud.draw(screen, facade.game_state)
+
+        alpha = facade.render_alpha
+        facade.game_state['cowboy'].draw(screen, alpha)
+        render_queue = facade.render_queue
+        render_queue.submit('player_bullets', facade.game_state['cowboy'].bullets, alpha)
+        render_queue.submit('enemies', facade.game_state['enemies'], alpha)
+        render_queue.submit('boosters', facade.game_state['boosters'], alpha)
+        render_queue.submit('eagle_bullets', facade.game_state['eagle_bullets'], alpha)
+        render_queue.flush(screen, doreturn=False)
 
         overlay = pygame.Surface((WIDTH, HEIGHT))
         overlay.set_alpha(200)
@@ -458,8 +971,8 @@ class PauseState(GameState):
 # Состояние окончания игры
 class GameOverState(GameState):
     def __init__(self, facade):
-        self.title_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
+        self.title_font = ResourceManager().get_font("Arial", 48, bold=True)
+        self.text_font = ResourceManager().get_font("Arial", 24, bold=True)
         self.restart_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 40, 200, 50)
         self.final_score = facade.game_state['score']
 
@@ -478,7 +991,7 @@ class GameOverState(GameState):
         pass
 
     def draw(self, facade, screen):
-        screen.fill((135, 206, 235))
+        screen.fill(BACKGROUND_COLOR)
         overlay = pygame.Surface((WIDTH, HEIGHT))
         overlay.set_alpha(200)
         overlay.fill((50, 50, 50))
@@ -488,9 +1001,11 @@ class GameOverState(GameState):
         game_over_rect = game_over_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 60))
         screen.blit(game_over_text, game_over_rect)
 
-        score_display = self.text_font.render(f"Final Score: {self.final_score}", True, (255, 255, 255))
-        score_rect = score_display.get_rect(center=(WIDTH // 2, HEIGHT // 2))
-        screen.blit(score_display, score_rect)
+        score_atlas = ResourceManager().get_glyph_atlas(self.text_font, (255, 255, 255))
+        score_text = f"Final Score: {self.final_score}"
+        score_rect = pygame.Rect((0, 0), score_atlas.size(score_text))
+        score_rect.center = (WIDTH // 2, HEIGHT // 2)
+        score_atlas.draw(screen, score_text, score_rect.topleft)
 
         pygame.draw.rect(screen, (0, 255, 0), self.restart_button)
         pygame.draw.rect(screen, (0, 0, 0), self.restart_button, 2)
@@ -501,6 +1016,8 @@ class GameOverState(GameState):
 
 # Абстрактный класс для команд
 class Command(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def execute(self):
         pass
@@ -509,10 +1026,22 @@ class Command(ABC):
     def undo(self):
         pass
 
+    # Упаковка для CommandHistory: (kind, dx, dy, prev_x, prev_y, bullet_serial)
+    @abstractmethod
+    def pack(self):
+        pass
+
 
 # Команда для движения
 class MoveCommand(Command):
+    __slots__ = ('cowboy', 'dx', 'dy', 'prev_x', 'prev_y')
+    kind = 0
+
     def __init__(self, cowboy, dx, dy):
+        self.reset(cowboy, dx, dy)
+
+    # Повторная настройка команды для переиспользования в следующем тике
+    def reset(self, cowboy, dx, dy):
         self.cowboy = cowboy
         self.dx = dx
         self.dy = dy
@@ -527,41 +1056,153 @@ class MoveCommand(Command):
         self.cowboy.update_rect()
 
     def undo(self):
-        self.cowboy.x = self.prev_x
-        self.cowboy.y = self.prev_y
-        self.cowboy.update_rect()
+        self.undo_record(self.cowboy, self.pack())
+
+    def pack(self):
+        return self.kind, self.dx, self.dy, self.prev_x, self.prev_y, -1
+
+    @staticmethod
+    def undo_record(cowboy, record):
+        cowboy.x = record[3]
+        cowboy.y = record[4]
+        cowboy.update_rect()
 
 
 # Команда для стрельбы
 class ShootCommand(Command):
+    __slots__ = ('cowboy', 'bullet', 'bullet_serial')
+    kind = 1
+
     def __init__(self, cowboy):
+        self.reset(cowboy)
+
+    def reset(self, cowboy):
         self.cowboy = cowboy
         self.bullet = None
+        self.bullet_serial = None
 
     def execute(self):
         if self.cowboy.shoot_timer <= 0:
-            self.bullet = BulletFactory.create_bullet("player", self.cowboy.x + 16, self.cowboy.y)
-            self.cowboy.bullets.append(self.bullet)
+            self.bullet = self.cowboy.bullet_factory.create_bullet("player", self.cowboy.x + 16, self.cowboy.y)
+            self.bullet_serial = self.bullet.serial
+            self.cowboy.bullets.add(self.bullet)
             self.cowboy.shoot_timer = (self.cowboy.shoot_cooldown // 2
                                        if self.cowboy.boost_active
                                        else self.cowboy.shoot_cooldown)
         self.cowboy.shoot_timer -= 1
 
     def undo(self):
-        if self.bullet and self.bullet in self.cowboy.bullets:
-            self.cowboy.bullets.remove(self.bullet)
-            self.cowboy.shoot_timer = 0
+        self.undo_record(self.cowboy, self.pack())
+
+    def pack(self):
+        return self.kind, 0, 0, 0.0, 0.0, self.bullet_serial if self.bullet else -1
+
+    # Пуля ищется по серийному номеру: объект мог вернуться в пул и уйти в новый выстрел
+    @staticmethod
+    def undo_record(cowboy, record):
+        bullet_serial = record[5]
+        if bullet_serial < 0:
+            return
+        for bullet in cowboy.bullets:
+            if bullet.serial == bullet_serial:
+                cowboy.bullets.remove(bullet)
+                cowboy.bullet_factory.release_bullet(bullet)
+                cowboy.shoot_timer = 0
+                return
+
+
+COMMAND_TYPES = (MoveCommand, ShootCommand)
+
+
+# Слияние ввода за тик: стрелки и WASD складываются в одно результирующее движение,
+# так что на каждое действие приходится один execute_command. Объекты команд переиспользуются -
+# история хранит только их упакованные записи
+class CommandCoalescer:
+    def __init__(self):
+        self.move_command = None
+        self.shoot_command = None
+
+    @staticmethod
+    def movement(keys, wasd_controls):
+        dx = (keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) + wasd_controls['move_x']
+        dy = (keys[pygame.K_DOWN] - keys[pygame.K_UP]) + wasd_controls['move_y']
+        return dx, dy
+
+    def apply(self, cowboy, keys, wasd_controls):
+        dx, dy = self.movement(keys, wasd_controls)
+        if dx or dy:
+            if self.move_command is None:
+                self.move_command = MoveCommand(cowboy, dx, dy)
+            else:
+                self.move_command.reset(cowboy, dx, dy)
+            cowboy.execute_command(self.move_command)
+
+        if keys[pygame.K_SPACE]:
+            if self.shoot_command is None:
+                self.shoot_command = ShootCommand(cowboy)
+            else:
+                self.shoot_command.reset(cowboy)
+            cowboy.execute_command(self.shoot_command)
+
+        if keys[pygame.K_z]:
+            cowboy.undo_last_command()
+
+
+# Кольцевой буфер истории команд фиксированной глубины. Команды хранятся не объектами,
+# а упакованными записями в массивах: вид, dx/dy, прежняя позиция, серийный номер пули
+class CommandHistory:
+    def __init__(self, depth=COMMAND_HISTORY_DEPTH):
+        self.depth = depth
+        self.kind = array('b', bytes(depth))
+        self.dx = array('b', bytes(depth))
+        self.dy = array('b', bytes(depth))
+        self.prev_x = array('d', [0.0]) * depth
+        self.prev_y = array('d', [0.0]) * depth
+        self.bullet_serial = array('q', [-1]) * depth
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, kind, dx, dy, prev_x, prev_y, bullet_serial):
+        i = self.head
+        self.kind[i] = kind
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.prev_x[i] = prev_x
+        self.prev_y[i] = prev_y
+        self.bullet_serial[i] = bullet_serial
+        self.head = (i + 1) % self.depth
+        if self.size < self.depth:
+            self.size += 1
+
+    def pop(self):
+        if not self.size:
+            return None
+        self.head = i = (self.head - 1) % self.depth
+        self.size -= 1
+        return (self.kind[i], self.dx[i], self.dy[i], self.prev_x[i], self.prev_y[i], self.bullet_serial[i])
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
 
 
 # Абстрактный класс Prototype
 class Prototype(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def clone(self):
         pass
 
 
 # Абстрактный класс для объектов, которые можно обновлять и рисовать
+# Пустые __slots__ у абстрактных баз позволяют наследникам-сущностям обходиться без __dict__
 class GameObject(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def update(self):
         pass
@@ -571,6 +1212,97 @@ class GameObject(ABC):
         pass
 
 
+# Атлас глифов: символы растеризуются шрифтом один раз в общую поверхность, строки собираются
+# из областей атласа через Surface.blits. Недостающие символы добавляются перестройкой атласа
+class GlyphAtlas:
+    DEFAULT_CHARSET = "0123456789 :!" + "ScoreTimBstWavFinlHhGmOvrCcd"
+
+    def __init__(self, font, color, charset=DEFAULT_CHARSET):
+        self.font = font
+        self.color = tuple(color[:3])
+        self.height = font.get_height()
+        self.surface = None
+        self.areas = {}
+        self._build(charset)
+
+    def _build(self, chars):
+        chars = "".join(dict.fromkeys("".join(self.areas) + chars))
+        glyphs = [(char, self.font.render(char, True, self.color)) for char in chars]
+        width = sum(glyph.get_width() for _, glyph in glyphs)
+        # Отдельные глифы (например, "_") бывают выше font.get_height()
+        self.height = max([self.font.get_height()] + [glyph.get_height() for _, glyph in glyphs])
+        surface = pygame.Surface((max(1, width), self.height), pygame.SRCALPHA)
+        # Прозрачный фон цвета текста: сглаженные края глифов не темнеют при копировании
+        surface.fill((*self.color, 0))
+        areas = {}
+        x = 0
+        for char, glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            areas[char] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+        self.surface = surface
+        self.areas = areas
+
+    def _ensure(self, text):
+        missing = [char for char in text if char not in self.areas]
+        if missing:
+            self._build("".join(missing))
+
+    def size(self, text):
+        self._ensure(text)
+        return sum(self.areas[char].width for char in text), self.height
+
+    def blit_sequence(self, text, position):
+        self._ensure(text)
+        x, y = position
+        surface = self.surface
+        sequence = []
+        for char in text:
+            area = self.areas[char]
+            sequence.append((surface, (x, y), area))
+            x += area.width
+        return sequence
+
+    def draw(self, screen, text, position):
+        screen.blits(self.blit_sequence(text, position), doreturn=False)
+
+    def render(self, text):
+        width, height = self.size(text)
+        surface = pygame.Surface((max(1, width), height), pygame.SRCALPHA)
+        surface.fill((*self.color, 0))
+        surface.blits(self.blit_sequence(text, (0, 0)), doreturn=False)
+        return surface
+
+
+# LRU-кэш отрисованного текста: ключ (текст, шрифт, цвет), число поверхностей ограничено max_size.
+# rasterize(font, text, color) вызывается только при промахе
+class TextCache:
+    def __init__(self, max_size=256, rasterize=None):
+        self.max_size = max_size
+        self.rasterize = rasterize if rasterize is not None else (
+            lambda font, text, color: font.render(text, True, color))
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (text, font, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.rasterize(font, text, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
 # Singleton для управления ресурсами
 class ResourceManager:
     _instance = None
@@ -581,14 +1313,83 @@ class ResourceManager:
             cls._instance._load_resources()
         return cls._instance
 
+    TEXTURE_FILES = {
+        'cowboy': 'assets/Cowboy4_idle with gun_0.png',
+        'bandit': 'assets/pixel_skeleton_uno.png',
+        'eagle': 'assets/spr_enemy_boss_09_dead.png',
+        'booster': 'assets/exp-removebg-preview.png',
+        'hp': 'assets/hp-removebg-preview.png',
+    }
+
     def _load_resources(self):
-        self.textures = {
-            'cowboy': pygame.image.load('assets/Cowboy4_idle with gun_0.png'),
-            'bandit': pygame.image.load('assets/pixel_skeleton_uno.png'),
-            'eagle': pygame.image.load('assets/spr_enemy_boss_09_dead.png'),
-            'booster': pygame.image.load('assets/exp-removebg-preview.png'),
-            'hp': pygame.image.load('assets/hp-removebg-preview.png')
-        }
+        self.images = {name: pygame.image.load(path) for name, path in self.TEXTURE_FILES.items()}
+        self.display_format = False
+        self._build_atlas()
+        self.fonts = {}
+        self.glyph_atlases = {}
+        self.text_cache = TextCache(rasterize=lambda font, text, color: self.get_glyph_atlas(font, color).render(text))
+
+    # Все спрайты упакованы в одну поверхность-атлас (в ряд), textures[имя] - подповерхность атласа.
+    # Если окно уже создано, атлас переводится в формат дисплея (convert_alpha), иначе
+    # остаётся в формате загрузки - так ResourceManager работает и в headless-режиме
+    def _build_atlas(self):
+        width = sum(image.get_width() for image in self.images.values())
+        height = max(image.get_height() for image in self.images.values())
+        atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.atlas_rects = {}
+        x = 0
+        for name, image in self.images.items():
+            # BLEND_RGBA_MAX по прозрачному фону копирует пиксели вместе с альфой без смешивания
+            atlas.blit(image, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self.atlas_rects[name] = pygame.Rect(x, 0, image.get_width(), image.get_height())
+            x += image.get_width()
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+            self.display_format = True
+        self.atlas = atlas
+        self.textures = {name: atlas.subsurface(rect) for name, rect in self.atlas_rects.items()}
+        self.derived_textures = {}
+
+    # Повторная упаковка после создания окна, если ресурсы загрузились раньше него.
+    # Сущности, уже взявшие старые текстуры, продолжают рисовать их без преобразования
+    def convert_for_display(self):
+        if not self.display_format and pygame.display.get_surface() is not None:
+            self._build_atlas()
+        return self.display_format
+
+    # Производные текстуры (масштабированные копии) строятся один раз и разделяются всеми сущностями.
+    # Ключ кэша - (имя, размер, флаги); вернувшуюся поверхность нельзя изменять на месте
+    def get_texture(self, name, size=None, smooth=False):
+        if size is None:
+            return self.textures[name]
+        key = (name, size, smooth)
+        texture = self.derived_textures.get(key)
+        if texture is None:
+            scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+            texture = scale(self.textures[name], size)
+            self.derived_textures[key] = texture
+        return texture
+
+    # Реестр шрифтов: поиск системного шрифта в SysFont медленный, поэтому каждая
+    # комбинация (семейство, размер, жирность) разрешается один раз
+    def get_font(self, family, size, bold=False):
+        key = (family, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(family, size, bold=bold)
+            self.fonts[key] = font
+        return font
+
+    def get_glyph_atlas(self, font, color):
+        key = (font, tuple(color))
+        atlas = self.glyph_atlases.get(key)
+        if atlas is None:
+            atlas = GlyphAtlas(font, color)
+            self.glyph_atlases[key] = atlas
+        return atlas
+
+    def render_text(self, font, text, color):
+        return self.text_cache.render(font, text, color)
 
     @staticmethod
     def get_instance():
@@ -597,6 +1398,58 @@ class ResourceManager:
         return ResourceManager._instance
 
 
+# Пул переиспользуемых объектов: прогрев, лимит свободных экземпляров и счётчики.
+# Объект пула должен уметь reset(*args) - повторную инициализацию вместо конструктора
+class ObjectPool:
+    def __init__(self, factory, capacity=256, prewarm=0):
+        self.factory = factory
+        self.capacity = capacity
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+        self.in_use = 0
+        self.high_water = 0
+        self.prewarm(prewarm)
+
+    def prewarm(self, count):
+        while len(self.free) < min(count, self.capacity):
+            obj = self.factory()
+            obj.pooled = True
+            self.free.append(obj)
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            self.hits += 1
+        else:
+            obj = self.factory()
+            self.misses += 1
+        obj.pooled = False
+        obj.reset(*args)
+        self.in_use += 1
+        if self.in_use > self.high_water:
+            self.high_water = self.in_use
+        return obj
+
+    def release(self, obj):
+        if obj.pooled:
+            return
+        obj.pooled = True
+        self.in_use -= 1
+        if len(self.free) < self.capacity:
+            self.free.append(obj)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'in_use': self.in_use,
+            'high_water': self.high_water,
+            'free': len(self.free),
+            'capacity': self.capacity,
+        }
+
+
 # Абстрактная фабрика врагов с использованием Prototype
 class EnemyFactory(ABC):
     @abstractmethod
@@ -605,27 +1458,28 @@ class EnemyFactory(ABC):
 
 
 class BanditFactory(EnemyFactory):
-    def __init__(self):
-        self.prototype_linear = Bandit(0, 0, LinearMovementStrategy())
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.prototype_linear = Bandit(0, 0, LinearMovementStrategy(rng))
         self.prototype_zigzag = Bandit(0, 0, ZigZagMovementStrategy())
 
     def create_enemy(self, x):
         # 30% chance for ZigZagMovementStrategy, 70% for LinearMovementStrategy
-        prototype = self.prototype_zigzag if random.random() < 0.3 else self.prototype_linear
+        prototype = self.prototype_zigzag if self.rng.random() < 0.3 else self.prototype_linear
         enemy = prototype.clone()
-        enemy.x = x
-        enemy.y = 0
+        enemy.reset(x, 0)
         return enemy
 
 
 class EagleFactory(EnemyFactory):
-    def __init__(self):
-        self.prototype = Eagle(0, 0, SinusoidalMovementStrategy())
+    def __init__(self, rng=random, bullet_factory=None):
+        self.rng = rng
+        self.prototype = Eagle(0, 0, SinusoidalMovementStrategy(), rng,
+                               bullet_factory if bullet_factory is not None else UNPOOLED_BULLETS)
 
     def create_enemy(self):
         enemy = self.prototype.clone()
-        enemy.x = random.randint(0, WIDTH)
-        enemy.y = 0
+        enemy.reset(self.rng.randint(0, WIDTH), 0)
         return enemy
 
 
@@ -635,46 +1489,71 @@ class BoosterFactory(ABC):
     def create_booster(self, x, y):
         pass
 
+    def release_booster(self, booster):
+        self.pool.release(booster)
+
 
 class SpeedBoosterFactory(BoosterFactory):
-    def __init__(self):
+    def __init__(self, pool_capacity=64, prewarm=8):
         self.prototype = Booster(0, 0)
+        self.pool = ObjectPool(self.prototype.clone, pool_capacity, prewarm)
 
     def create_booster(self, x, y):
-        booster = self.prototype.clone()
-        booster.x = x
-        booster.y = y
-        return booster
+        return self.pool.acquire(x, y)
 
 
 class HealFactory(BoosterFactory):
-    def __init__(self):
+    def __init__(self, pool_capacity=64, prewarm=8):
         self.prototype = Heal(0, 0)
+        self.pool = ObjectPool(self.prototype.clone, pool_capacity, prewarm)
 
     def create_booster(self, x, y):
-        booster = self.prototype.clone()
-        booster.x = x
-        booster.y = y
-        return booster
+        return self.pool.acquire(x, y)
 
 
-# Обычная фабрика для пуль
+# Фабрика пуль. Каждый движок владеет своей фабрикой (как фабрики бустеров - своими пулами):
+# пули берутся из пулов фабрики и возвращаются через release_bullet(). pooled=False - пули создаются заново
 class BulletFactory:
-    @staticmethod
-    def create_bullet(bullet_type, x, y):
-        if bullet_type == "player":
-            return Bullet(x, y)
+    def __init__(self, pooled=True, capacity=512, prewarm_player=64, prewarm_eagle=32):
+        self.pools = {}
+        if pooled:
+            self.pools = {
+                "player": ObjectPool(lambda: Bullet(0, 0), capacity, prewarm_player),
+                "eagle": ObjectPool(lambda: EagleBullet(0, 0), capacity, prewarm_eagle),
+            }
+        self._serials = itertools.count()
+
+    def create_bullet(self, bullet_type, x, y):
+        pool = self.pools.get(bullet_type)
+        if pool is not None:
+            bullet = pool.acquire(x, y)
+        elif bullet_type == "player":
+            bullet = Bullet(x, y)
         elif bullet_type == "eagle":
-            return EagleBullet(x, y)
+            bullet = EagleBullet(x, y)
         else:
             raise ValueError("Unknown bullet type")
+        bullet.serial = next(self._serials)
+        return bullet
+
+    def release_bullet(self, bullet):
+        pool = self.pools.get(bullet.bullet_type)
+        if pool is not None:
+            pool.release(bullet)
+
+
+# Фабрика по умолчанию для сущностей, созданных вне движка: без пулов, общих счётчиков у неё нет
+UNPOOLED_BULLETS = BulletFactory(pooled=False)
 
 
 # Базовый класс сущности
 class Entity(GameObject):
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'speed', 'rect', 'pooled')
+
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
+        self.pooled = False
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
         self.speed = 2
         self.rect = pygame.Rect(x, y, 32, 32)
 
@@ -682,6 +1561,20 @@ class Entity(GameObject):
         self.rect.x = self.x
         self.rect.y = self.y
 
+    # Повторная инициализация объекта, взятого из ObjectPool (или только что клонированного)
+    def reset(self, x, y):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+        self.update_rect()
+
+    # Позиция до очередного тика: отрисовка интерполирует между ней и текущей
+    def snapshot(self):
+        self.prev_x = self.x
+        self.prev_y = self.y
+
+    def interpolated(self, alpha):
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
+
     def move(self):
         pass
 
@@ -700,19 +1593,21 @@ class EntityRenderer(ABC):
 
 
 class CowboyRenderer(EntityRenderer):
-    def render(self, screen, entity):
-        screen.blit(entity.texture, (entity.x, entity.y))
+    def render(self, screen, entity, alpha=1.0):
+        return screen.blit(entity.texture, entity.interpolated(alpha))
 
 
 # Класс игрока
 class Cowboy(Entity, Subject):
-    def __init__(self, x, y, renderer=CowboyRenderer()):
+    def __init__(self, x, y, renderer=CowboyRenderer(), history_depth=COMMAND_HISTORY_DEPTH,
+                 bullet_factory=UNPOOLED_BULLETS):
         Entity.__init__(self, x, y)
         Subject.__init__(self)
         self.renderer = renderer
+        self.bullet_factory = bullet_factory
         self.texture = ResourceManager().textures['cowboy']
         self.rect = pygame.Rect(x, y, 32, 32)
-        self.bullets = []
+        self.bullets = CompositeGroup()
         self.shoot_timer = 0
         self.speed_boost = 1.0
         self.damage_boost = 1.0
@@ -723,16 +1618,16 @@ class Cowboy(Entity, Subject):
         self.boost_duration = 0
         self.boost_active = False
         self.height = self.texture.get_height()
-        self.command_history = []
+        self.command_history = CommandHistory(history_depth)
 
     def execute_command(self, command):
         command.execute()
-        self.command_history.append(command)
+        self.command_history.push(*command.pack())
 
     def undo_last_command(self):
-        if self.command_history:
-            last_command = self.command_history.pop()
-            last_command.undo()
+        record = self.command_history.pop()
+        if record is not None:
+            COMMAND_TYPES[record[0]].undo_record(self, record)
 
     def update_boost(self):
         if self.boost_active:
@@ -756,8 +1651,8 @@ class Cowboy(Entity, Subject):
             self.boost_active = True
         self.notify("booster_collected", {"duration": self.boost_duration})
 
-    def draw(self, screen):
-        self.renderer.render(screen, self)
+    def draw(self, screen, alpha=1.0):
+        return self.renderer.render(screen, self, alpha)
 
 
 # Декоратор для ускоренной стрельбы
@@ -767,14 +1662,25 @@ class SpeedBoostDecorator:
 
     def __call__(self):
         if self.cowboy.shoot_timer <= 0:
-            bullet = BulletFactory.create_bullet("player", self.cowboy.x + 16, self.cowboy.y)
-            self.cowboy.bullets.append(bullet)
+            bullet = self.cowboy.bullet_factory.create_bullet("player", self.cowboy.x + 16, self.cowboy.y)
+            self.cowboy.bullets.add(bullet)
             self.cowboy.shoot_timer = self.cowboy.shoot_cooldown // 2
         self.cowboy.shoot_timer -= 1
 
 
+# Пули рисуются заранее подготовленной поверхностью, общей для всех пуль класса
+def bullet_surface(size, color):
+    surface = pygame.Surface(size)
+    surface.fill(color)
+    return surface
+
+
 # Класс пули игрока
 class Bullet(Entity):
+    __slots__ = ('serial',)
+    bullet_type = "player"
+    texture = bullet_surface((4, 8), (255, 255, 0))
+
     def __init__(self, x, y):
         super().__init__(x, y)
         self.speed = 5
@@ -785,11 +1691,15 @@ class Bullet(Entity):
         self.update_rect()
 
     def draw(self, screen):
-        pygame.draw.rect(screen, (255, 255, 0), (self.x, self.y, 4, 8))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
 # Класс пули орла
 class EagleBullet(Entity):
+    __slots__ = ('serial',)
+    bullet_type = "eagle"
+    texture = bullet_surface((8, 4), (255, 0, 0))
+
     def __init__(self, x, y):
         super().__init__(x, y)
         self.speed = 3
@@ -800,11 +1710,13 @@ class EagleBullet(Entity):
         self.update_rect()
 
     def draw(self, screen):
-        pygame.draw.rect(screen, (255, 0, 0), (self.x, self.y, 8, 4))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
 # Класс бандита с реализацией Prototype и Strategy
 class Bandit(Entity, Prototype):
+    __slots__ = ('texture', 'hp', 'base_speed', 'max_speed', 'movement_strategy', 'angle')
+
     def __init__(self, x, y, movement_strategy=LinearMovementStrategy()):
         super().__init__(x, y)
         self.texture = ResourceManager().textures['bandit']
@@ -825,23 +1737,29 @@ class Bandit(Entity, Prototype):
         self.update_rect()
 
     def draw(self, screen):
-        screen.blit(self.texture, (self.x, self.y))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
 # Класс орла с реализацией Prototype и Strategy
 class Eagle(Entity, Prototype):
-    def __init__(self, x, y, movement_strategy=SinusoidalMovementStrategy()):
+    __slots__ = ('texture', 'hp', 'angle', 'shoot_timer', 'base_speed', 'max_speed', 'movement_strategy', 'rng',
+                 'bullet_factory')
+
+    def __init__(self, x, y, movement_strategy=SinusoidalMovementStrategy(), rng=random,
+                 bullet_factory=UNPOOLED_BULLETS):
         super().__init__(x, y)
+        self.rng = rng
+        self.bullet_factory = bullet_factory
         self.texture = ResourceManager().textures['eagle']
         self.hp = 1
         self.angle = 0
-        self.shoot_timer = random.randint(30, 60)
+        self.shoot_timer = rng.randint(30, 60)
         self.base_speed = 1
         self.max_speed = 3
         self.movement_strategy = movement_strategy
 
     def clone(self):
-        return Eagle(self.x, self.y, self.movement_strategy)
+        return Eagle(self.x, self.y, self.movement_strategy, self.rng, self.bullet_factory)
 
     def move(self):
         self.movement_strategy.move(self, time=None)
@@ -852,20 +1770,21 @@ class Eagle(Entity, Prototype):
 
     def shoot(self):
         if self.shoot_timer <= 0:
-            self.shoot_timer = random.randint(30, 60)
-            return BulletFactory.create_bullet("eagle", self.x + 16, self.y + 32)
+            self.shoot_timer = self.rng.randint(30, 60)
+            return self.bullet_factory.create_bullet("eagle", self.x + 16, self.y + 32)
         return None
 
     def draw(self, screen):
-        screen.blit(self.texture, (self.x, self.y))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
 # Класс бустера с реализацией Prototype
 class Booster(Entity, Prototype):
+    __slots__ = ('texture', 'boost_value', 'duration')
+
     def __init__(self, x, y):
         super().__init__(x, y)
-        original_texture = ResourceManager().textures['booster']
-        self.texture = pygame.transform.scale(original_texture, (16, 16))
+        self.texture = ResourceManager().get_texture('booster', (16, 16))
         self.rect = self.texture.get_rect(topleft=(x, y))
         self.speed = 3
         self.boost_value = 5
@@ -883,15 +1802,16 @@ class Booster(Entity, Prototype):
         cowboy.apply_booster(self.duration, self.boost_value)
 
     def draw(self, screen):
-        screen.blit(self.texture, (self.x, self.y))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
 # Класс лечения с реализацией Prototype
 class Heal(Entity, Prototype):
+    __slots__ = ('texture', 'heal_value')
+
     def __init__(self, x, y):
         super().__init__(x, y)
-        original_texture = ResourceManager().textures['hp']
-        self.texture = pygame.transform.scale(original_texture, (32, 16))
+        self.texture = ResourceManager().get_texture('hp', (32, 16))
         self.rect = self.texture.get_rect(topleft=(x, y))
         self.speed = 3
         self.heal_value = 1
@@ -909,33 +1829,406 @@ class Heal(Entity, Prototype):
             cowboy.set_health(cowboy.hp + self.heal_value)
 
     def draw(self, screen):
-        screen.blit(self.texture, (self.x, self.y))
+        return screen.blit(self.texture, (self.x, self.y))
 
 
-# Композит для управления группами объектов
+# Композит для управления группами объектов.
+# Дети хранятся в dict как упорядоченное множество: удаление за O(1), обход в порядке добавления.
+# Внутри deferred() удаления откладываются до выхода из блока, поэтому группу можно обходить без копии
 class CompositeGroup(GameObject):
     def __init__(self):
-        self.children = []
+        self._children = {}
+        self._pending = None
+
+    @property
+    def children(self):
+        return self._children.keys()
+
+    def __iter__(self):
+        return iter(self._children)
+
+    def __len__(self):
+        return len(self._children)
+
+    def __contains__(self, obj):
+        return obj in self._children
 
     def add(self, obj):
-        self.children.append(obj)
+        self._children[obj] = None
 
     def remove(self, obj):
-        self.children.remove(obj)
+        if self._pending is not None:
+            self._pending.append(obj)
+        else:
+            del self._children[obj]
+
+    @contextmanager
+    def deferred(self):
+        outer = self._pending
+        self._pending = []
+        try:
+            yield self
+        finally:
+            pending, self._pending = self._pending, outer
+            if outer is not None:
+                outer.extend(pending)
+            else:
+                for obj in pending:
+                    self._children.pop(obj, None)
 
     def update(self):
-        for obj in self.children[:]:
+        for obj in self._children:
             obj.update()
 
+    def snapshot(self):
+        for obj in self._children:
+            obj.snapshot()
+
+    # Возвращает границы нарисованных объектов, включая вложенные группы
     def draw(self, screen):
-        for obj in self.children:
-            obj.draw(screen)
+        rects = []
+        for obj in self._children:
+            if isinstance(obj, CompositeGroup):
+                rects.extend(obj.draw(screen))
+            else:
+                rect = obj.draw(screen)
+                if rect is not None:
+                    rects.append(rect)
+        return rects
+
+
+# Очередь отрисовки: пары (текстура, позиция) собираются по слоям из групп и уходят на экран
+# одним Surface.blits на слой. Слои выводятся в порядке первого submit, списки слоёв
+# переиспользуются между кадрами. Группа содержит либо только подгруппы (волны), либо только сущности.
+# alpha < 1 - позиция интерполируется между снимком prev_x/prev_y и текущей
+class RenderQueue:
+    def __init__(self):
+        self.layers = {}
+
+    def submit(self, layer, group, alpha=1.0):
+        items = self.layers.get(layer)
+        if items is None:
+            items = self.layers[layer] = []
+        self._collect(items, group, alpha)
+
+    def _collect(self, items, group, alpha):
+        if isinstance(next(iter(group), None), CompositeGroup):
+            for child in group:
+                self._collect(items, child, alpha)
+        elif alpha >= 1.0:
+            items += [(obj.texture, (obj.x, obj.y)) for obj in group]
+        else:
+            items += [(obj.texture, (obj.prev_x + (obj.x - obj.prev_x) * alpha,
+                                     obj.prev_y + (obj.y - obj.prev_y) * alpha)) for obj in group]
+
+    def flush(self, screen, doreturn=True):
+        rects = []
+        for items in self.layers.values():
+            if items:
+                if doreturn:
+                    rects.extend(screen.blits(items))
+                else:
+                    screen.blits(items, doreturn=False)
+                items.clear()
+        return rects
+
+
+# Жизненный цикл сущностей, которыми управляет медиатор (враги, бустеры, пули орлов):
+# счётчики появлений и исчезновений по типам и отсев врагов, ушедших за поле дальше margin.
+# Без отсева улетевшие враги навсегда оставались в волнах и обрабатывались каждый тик
+class LifecycleManager:
+    def __init__(self, margin=OFFSCREEN_MARGIN):
+        self.margin = margin
+        self.bounds = pygame.Rect(-margin, -margin, WIDTH + 2 * margin, HEIGHT + 2 * margin)
+        self.spawned = {}
+        self.despawned = {}
+        self.culled = {}
+
+    def spawn(self, group, entity):
+        group.add(entity)
+        name = type(entity).__name__
+        self.spawned[name] = self.spawned.get(name, 0) + 1
+
+    def despawn(self, group, entity):
+        group.remove(entity)
+        name = type(entity).__name__
+        self.despawned[name] = self.despawned.get(name, 0) + 1
+
+    def cull(self, groups):
+        bounds = self.bounds
+        for group in groups:
+            with group.deferred():
+                for entity in group:
+                    if not bounds.colliderect(entity.rect):
+                        self.despawn(group, entity)
+                        name = type(entity).__name__
+                        self.culled[name] = self.culled.get(name, 0) + 1
+
+    def live(self):
+        return {name: count - self.despawned.get(name, 0) for name, count in self.spawned.items()}
+
+    def stats(self):
+        return {'spawned': dict(self.spawned), 'despawned': dict(self.despawned),
+                'culled': dict(self.culled), 'live': self.live()}
+
+
+# Источник состояния клавиатуры для живой игры
+class PygameKeyboard:
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+
+# Источник состояния клавиатуры для headless-режима: нажатые клавиши задаются программно
+class ScriptedKeyboard:
+    def __init__(self):
+        self.pressed = frozenset()
+
+    def set_pressed(self, keys):
+        self.pressed = frozenset(keys)
+
+    def get_pressed(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+# Действия, которые потребляет медиатор, в порядке битов маски тика; старший бит - пауза
+REPLAY_ACTION_KEYS = (
+    pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+    pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d,
+    pygame.K_SPACE, pygame.K_z,
+)
+REPLAY_KEY_BITS = {key: 1 << bit for bit, key in enumerate(REPLAY_ACTION_KEYS)}
+REPLAY_PAUSE = 1 << len(REPLAY_ACTION_KEYS)
+
+
+def encode_actions(keys):
+    mask = 0
+    for key, bit in REPLAY_KEY_BITS.items():
+        if keys[key]:
+            mask |= bit
+    return mask
+
+
+# Запись партии: seed и маска действий на каждый тик. В файле маски хранятся серийно
+# (пары маска/длина серии, uint16 little-endian), так что удержание клавиш почти ничего не стоит
+class Replay:
+    HEADER = struct.Struct('<4sBqII')
+    MAGIC = b'CSRP'
+    VERSION = 1
+
+    # seed хранится в заголовке знаковым 64-битным полем; проверка здесь, а не в save(),
+    # чтобы неподходящий seed отвергался до начала партии, а не терял запись при выходе
+    SEED_MIN, SEED_MAX = -2 ** 63, 2 ** 63 - 1
+
+    def __init__(self, seed, masks=None):
+        if not isinstance(seed, int) or not self.SEED_MIN <= seed <= self.SEED_MAX:
+            raise ValueError(f"replay seed must be an integer in [{self.SEED_MIN}, {self.SEED_MAX}], got {seed!r}")
+        self.seed = seed
+        self.masks = masks if masks is not None else array('H')
+
+    def __len__(self):
+        return len(self.masks)
+
+    def save(self, path):
+        runs = array('H')
+        for mask, group in itertools.groupby(self.masks):
+            length = sum(1 for _ in group)
+            while length > 0:
+                runs.append(mask)
+                runs.append(min(length, 0xFFFF))
+                length -= 0xFFFF
+        if sys.byteorder == 'big':
+            runs.byteswap()
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, len(self.masks), len(runs) // 2))
+            file.write(runs.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            magic, version, seed, ticks, run_count = cls.HEADER.unpack(file.read(cls.HEADER.size))
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"{path} is not a version {cls.VERSION} replay")
+            runs = array('H')
+            runs.frombytes(file.read(run_count * 2 * runs.itemsize))
+        if sys.byteorder == 'big':
+            runs.byteswap()
+        masks = array('H')
+        for i in range(0, len(runs), 2):
+            masks.extend(array('H', [runs[i]]) * runs[i + 1])
+        if len(masks) != ticks:
+            raise ValueError(f"{path} is truncated: {len(masks)} of {ticks} ticks")
+        return cls(seed, masks)
+
+
+# Запись ввода по тикам: PlayingState вызывает record() перед каждым тиком,
+# mark_pause() помечает паузу, случившуюся перед следующим записанным тиком
+class InputRecorder:
+    def __init__(self, seed):
+        self.replay = Replay(seed)
+        self.pending = 0
+
+    def reset(self):
+        self.replay = Replay(self.replay.seed)
+        self.pending = 0
+
+    def record(self, keys):
+        self.replay.masks.append(encode_actions(keys) | self.pending)
+        self.pending = 0
+
+    def mark_pause(self):
+        self.pending |= REPLAY_PAUSE
+
+
+# Источник клавиатуры для воспроизведения: отдаёт записанные маски по одной на тик.
+# Подставляется вместо PygameKeyboard и тем самым заменяет и get_pressed, и WASDInput.read_input
+class ReplayKeyboard:
+    def __init__(self, replay):
+        self.masks = replay.masks
+        self.tick = -1
+        self.mask = 0
+        self.pauses = 0
+
+    def advance(self):
+        self.tick += 1
+        if self.tick >= len(self.masks):
+            self.mask = 0
+            return False
+        self.mask = self.masks[self.tick]
+        if self.mask & REPLAY_PAUSE:
+            self.pauses += 1
+        return True
+
+    def get_pressed(self):
+        return self
+
+    def __getitem__(self, key):
+        return bool(self.mask & REPLAY_KEY_BITS.get(key, 0))
+
+
+# Массивное (structure-of-arrays) хранилище врагов для стресс-сценариев.
+# Поля лежат в массивах NumPy, движение выполняется пакетными ядрами стратегий (move_batch),
+# sync() переносит результат обратно в объекты сущностей. hp хранится целым и в объекты не пишется:
+# урон наносит медиатор прямо сущностям
+class EntityStore:
+    FIELDS = ('x', 'y', 'speed', 'base_speed', 'max_speed', 'angle', 'width', 'height')
+    ARRAYS = FIELDS + ('hp', 'strategy_id')
+
+    def __init__(self, capacity=1024, seed=None):
+        if np is None:
+            raise RuntimeError("EntityStore requires NumPy")
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(capacity))
+        self.hp = np.zeros(capacity, dtype=np.int64)
+        self.strategy_id = np.zeros(capacity, dtype=np.int16)
+        self.strategies = []
+        self._strategy_ids = {}
+        self.entities = []
+        self.slots = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, entity):
+        return entity in self.slots
+
+    def _grow(self):
+        capacity = len(self.x) * 2
+        for field in self.ARRAYS:
+            array = getattr(self, field)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, field, grown)
+
+    def _strategy_index(self, strategy):
+        strategy_id = self._strategy_ids.get(id(strategy))
+        if strategy_id is None:
+            strategy_id = len(self.strategies)
+            self.strategies.append(strategy)
+            self._strategy_ids[id(strategy)] = strategy_id
+        return strategy_id
+
+    def add(self, entity):
+        if self.size == len(self.x):
+            self._grow()
+        i = self.size
+        self.x[i] = entity.x
+        self.y[i] = entity.y
+        self.speed[i] = entity.speed
+        self.base_speed[i] = entity.base_speed
+        self.max_speed[i] = entity.max_speed
+        self.angle[i] = entity.angle
+        self.hp[i] = entity.hp
+        self.width[i] = entity.rect.width
+        self.height[i] = entity.rect.height
+        self.strategy_id[i] = self._strategy_index(entity.movement_strategy)
+        self.entities.append(entity)
+        self.slots[entity] = i
+        self.size += 1
+        return i
+
+    # Удаление за O(1): на место удалённой записи переносится последняя
+    def remove(self, i):
+        last = self.size - 1
+        del self.slots[self.entities[i]]
+        if i != last:
+            for field in self.ARRAYS:
+                array = getattr(self, field)
+                array[i] = array[last]
+            self.entities[i] = self.entities[last]
+            self.slots[self.entities[i]] = i
+        self.entities.pop()
+        self.size = last
+
+    # Приводит состав хранилища к содержимому групп: новые сущности добавляются, исчезнувшие удаляются
+    def track(self, groups):
+        slots = self.slots
+        count = 0
+        for group in groups:
+            count += len(group)
+            for entity in group:
+                if entity not in slots:
+                    self.add(entity)
+        if self.size > count:
+            present = set()
+            for group in groups:
+                present.update(group.children)
+            entities = self.entities
+            for i in range(self.size - 1, -1, -1):
+                if entities[i] not in present:
+                    self.remove(i)
+
+    def update(self, time=None):
+        ids = self.strategy_id[:self.size]
+        for strategy_id, strategy in enumerate(self.strategies):
+            idx = np.flatnonzero(ids == strategy_id)
+            if len(idx):
+                strategy.move_batch(self, idx, time)
+
+    def sync(self):
+        size = self.size
+        for entity, x, y, speed, angle in zip(self.entities, self.x[:size].tolist(), self.y[:size].tolist(),
+                                              self.speed[:size].tolist(), self.angle[:size].tolist()):
+            entity.x = x
+            entity.y = y
+            entity.speed = speed
+            entity.angle = angle
+            rect = entity.rect
+            rect.x = x
+            rect.y = y
 
 
 # Адаптер для WASD ввода
 class WASDInput:
+    def __init__(self, keyboard=None):
+        self.keyboard = keyboard if keyboard is not None else PygameKeyboard()
+
     def read_input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.keyboard.get_pressed()
         return {
             'up': keys[pygame.K_w],
             'down': keys[pygame.K_s],
@@ -958,11 +2251,12 @@ class InputAdapter:
 
 # Builder и Director для создания игрового состояния
 class GameStateBuilder:
-    def __init__(self):
+    def __init__(self, bullet_factory=UNPOOLED_BULLETS):
+        self.bullet_factory = bullet_factory
         self.game_state = {}
 
     def set_cowboy(self):
-        self.game_state['cowboy'] = Cowboy(WIDTH // 2, HEIGHT - 64)
+        self.game_state['cowboy'] = Cowboy(WIDTH // 2, HEIGHT - 64, bullet_factory=self.bullet_factory)
         return self
 
     def set_enemies(self):
@@ -981,7 +2275,7 @@ class GameStateBuilder:
         return self
 
     def set_eagle_bullets(self):
-        self.game_state['eagle_bullets'] = []
+        self.game_state['eagle_bullets'] = CompositeGroup()
         return self
 
     def set_timers(self):
@@ -1012,41 +2306,120 @@ class GameDirector:
 
 # Фасад для упрощения работы с игровым движком
 class GameEngineFacade(Subject):
-    def __init__(self):
+    # Вся случайность симуляции идёт через self.rng: seed и поток ввода воспроизводят партию целиком.
+    # Без seed и rng генератор инициализируется из системной энтропии
+    # При заданном seed каждая партия начинается с переинициализации генератора, поэтому
+    # запись ввода одной партии воспроизводит её независимо от предыдущих.
+    # keyboard - внешний источник клавиатуры (например, ReplayKeyboard).
+    # index_factory, batch_collisions и entity_store - параметры медиатора (GameObjectMediatorImpl):
+    # медиатор создаётся заново на каждую партию и переживает паузы
+    def __init__(self, headless=False, event_mode=EventBus.DEFERRED, seed=None, rng=None, keyboard=None,
+                 index_factory=None, batch_collisions=False, entity_store=False):
         super().__init__()
+        self.headless = headless
+        self.mediator_options = {'index_factory': index_factory, 'batch_collisions': batch_collisions,
+                                 'entity_store': entity_store}
+        self.mediator = GameObjectMediatorImpl(**self.mediator_options)
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.event_bus = EventBus(event_mode)
+        if keyboard is None:
+            keyboard = ScriptedKeyboard() if headless else PygameKeyboard()
+        self.keyboard = keyboard
+        self.recorder = None
         self.resource_manager = ResourceManager.get_instance()
-        self.builder = GameStateBuilder()
+        self.bullet_factory = BulletFactory()
+        self.builder = GameStateBuilder(self.bullet_factory)
         self.director = GameDirector(self.builder)
-        self.bandit_factory = BanditFactory()
-        self.eagle_factory = EagleFactory()
+        self.bandit_factory = BanditFactory(self.rng)
+        self.eagle_factory = EagleFactory(self.rng, self.bullet_factory)
         self.speed_booster_factory = SpeedBoosterFactory()
         self.heal_factory = HealFactory()
-        self.wasd_input = InputAdapter(WASDInput())
-        self.title_font = pygame.font.SysFont("Arial", 48, bold=True)
-        self.text_font = pygame.font.SysFont("Arial", 24, bold=True)
-        self.hp_texture = pygame.transform.scale(self.resource_manager.textures['hp'], (40, 20))
-        self.notifications = []
+        self.wasd_input = InputAdapter(WASDInput(self.keyboard))
+        self.title_font = ResourceManager().get_font("Arial", 48, bold=True)
+        self.text_font = ResourceManager().get_font("Arial", 24, bold=True)
+        self.hp_texture = self.resource_manager.get_texture('hp', (40, 20))
+        self.hud = HUD(self.text_font, self.hp_texture)
+        self.notifications = CompositeGroup()
+        self.render_queue = RenderQueue()
+        # Доля тика, прошедшая после последнего обновления: 1.0 - рисовать текущее состояние
+        self.render_alpha = 1.0
+        self.profiler = FrameProfiler()
+        self.notification_pool = ObjectPool(lambda: Notification("", 0, 0, 0), MAX_NOTIFICATIONS, MAX_NOTIFICATIONS)
         self.game_state = None
+        self.lifecycle = LifecycleManager()
+        self.session_subscriptions = []
         self.current_state = MenuState()
 
+    # Число одновременных всплывающих уведомлений ограничено: самое старое уступает место новому
     def add_notification(self, text, x, y, duration, color):
-        notification = Notification(text, x, y, duration, color)
-        self.notifications.append(notification)
+        if len(self.notifications) >= MAX_NOTIFICATIONS:
+            oldest = next(iter(self.notifications))
+            self.notifications.remove(oldest)
+            self.notification_pool.release(oldest)
+        notification = self.notification_pool.acquire(text, x, y, duration, color)
+        self.notifications.add(notification)
+
+    def release_booster(self, booster):
+        factory = self.heal_factory if isinstance(booster, Heal) else self.speed_booster_factory
+        factory.release_booster(booster)
+
+    # Возвращает в пулы пули и бустеры предыдущей партии
+    def _release_pooled_objects(self):
+        for bullet in self.game_state['cowboy'].bullets:
+            self.bullet_factory.release_bullet(bullet)
+        for bullet in self.game_state['eagle_bullets']:
+            self.bullet_factory.release_bullet(bullet)
+        for booster in self.game_state['boosters']:
+            self.release_booster(booster)
+        for notification in self.notifications:
+            self.notification_pool.release(notification)
+
+    def pool_stats(self):
+        return {
+            'player_bullet': self.bullet_factory.pools['player'].stats(),
+            'eagle_bullet': self.bullet_factory.pools['eagle'].stats(),
+            'booster': self.speed_booster_factory.pool.stats(),
+            'heal': self.heal_factory.pool.stats(),
+            'notification': self.notification_pool.stats(),
+        }
 
+    # Наблюдатели живут одну партию: подписки прошлой партии отменяются при рестарте,
+    # иначе каждое событие расходилось бы по всем накопленным наблюдателям старых партий
     def start_new_game(self):
+        if self.game_state is not None:
+            self._release_pooled_objects()
+        for subscription in self.session_subscriptions:
+            subscription.cancel()
+        self.event_bus.clear()
+        if self.seed is not None:
+            self.rng.seed(self.seed)
+        if self.recorder is not None:
+            self.recorder.reset()
         self.game_state = self.director.construct_game_state()
-        self.notifications = []
+        self.mediator = GameObjectMediatorImpl(**self.mediator_options)
+        self.lifecycle = LifecycleManager()
+        self.notifications = CompositeGroup()
         score_observer = ScoreObserver(self.game_state)
         ui_observer = UIObserver(self)
         game_state_observer = GameStateObserver(self)
-        self.attach(score_observer)
-        self.attach(ui_observer)
-        self.game_state['cowboy'].attach(ui_observer)
-        self.game_state['cowboy'].attach(game_state_observer)
+        self.session_subscriptions = [self.game_state['cowboy'].subscribe(self.event_bus)]
+        for observer in (score_observer, ui_observer, game_state_observer):
+            self.session_subscriptions.extend(self.event_bus.subscribe_observer(observer))
 
     def change_state(self, new_state):
         self.current_state = new_state
 
+    def snapshot_positions(self):
+        if self.game_state is None:
+            return
+        cowboy = self.game_state['cowboy']
+        cowboy.snapshot()
+        cowboy.bullets.snapshot()
+        self.game_state['enemies'].snapshot()
+        self.game_state['boosters'].snapshot()
+        self.game_state['eagle_bullets'].snapshot()
+
     def handle_events(self):
         return self.current_state.handle_events(self)
 
@@ -1056,19 +2429,261 @@ class GameEngineFacade(Subject):
     def draw(self, screen):
         self.current_state.draw(self, screen)
 
+    # Headless-симуляция с фиксированным шагом: без окна, clock.tick и отрисовки.
+    # inputs - набор клавиш pygame.K_*, удерживаемых в течение всех n_ticks.
+    # Возвращает число реально выполненных тиков (меньше n_ticks, если игра окончена).
+    def step(self, n_ticks=1, inputs=()):
+        if not self.headless:
+            raise RuntimeError("step() is only available in headless mode")
+        if not hasattr(self.keyboard, 'set_pressed'):
+            raise RuntimeError(f"step() needs a keyboard with set_pressed(), got {type(self.keyboard).__name__}; "
+                               "use play_replay() to run a ReplayKeyboard")
+        if self.game_state is None:
+            self.start_new_game()
+            self.change_state(PlayingState())
+        self.keyboard.set_pressed(inputs)
+        for tick in range(n_ticks):
+            if not isinstance(self.current_state, PlayingState):
+                return tick
+            self.update()
+            if self.profiler.enabled:
+                self.profiler.end_frame(self.game_state)
+        return n_ticks
+
+    # Воспроизведение записи через ReplayKeyboard без окна и ограничения частоты.
+    # Паузы не влияют на симуляцию и пропускаются. Возвращает число выполненных тиков
+    def play_replay(self):
+        if not self.headless:
+            raise RuntimeError("play_replay() is only available in headless mode")
+        if self.game_state is None:
+            self.start_new_game()
+            self.change_state(PlayingState())
+        ticks = 0
+        while self.keyboard.advance():
+            if not isinstance(self.current_state, PlayingState):
+                break
+            self.update()
+            if self.profiler.enabled:
+                self.profiler.end_frame(self.game_state)
+            ticks += 1
+        return ticks
+
+
+# Профилировщик кадра: время фаз в кольцевых буферах за последние depth кадров.
+# Время фазы внутри кадра суммируется (за кадр может пройти несколько тиков), end_frame фиксирует кадр.
+# Пока enabled ложно, игра не вызывает профилировщик вовсе
+class FrameProfiler:
+    PHASES = ('input', 'update_objects', 'handle_collisions', 'draw', 'flip')
+
+    def __init__(self, depth=PROFILER_DEPTH, enabled=False):
+        self.depth = depth
+        self.enabled = enabled
+        self.enabled_before_overlay = enabled
+        self.overlay = False
+        self.buffers = {phase: array('d', [0.0]) * depth for phase in self.PHASES}
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.frames = 0
+        self.wave_counts = []
+        self.overlay_lines = []
+
+    def add(self, phase, seconds):
+        self.current[phase] += seconds
+
+    def end_frame(self, game_state=None):
+        slot = self.frames % self.depth
+        current = self.current
+        for phase, buffer in self.buffers.items():
+            buffer[slot] = current[phase] * 1000.0
+            current[phase] = 0.0
+        self.frames += 1
+        if game_state is not None:
+            self.wave_counts = [len(wave) for wave in game_state['waves']]
+        if self.overlay and self.frames % PROFILER_OVERLAY_REFRESH == 0:
+            self.overlay_lines = self.report_lines()
+
+    # min/mean/p95/p99 в миллисекундах по кадрам, оставшимся в буфере
+    def stats(self):
+        count = min(self.frames, self.depth)
+        result = {}
+        for phase, buffer in self.buffers.items():
+            samples = sorted(buffer[:count]) or [0.0]
+            result[phase] = {
+                'min': samples[0],
+                'mean': sum(samples) / len(samples),
+                'p95': samples[max(0, math.ceil(len(samples) * 0.95) - 1)],
+                'p99': samples[max(0, math.ceil(len(samples) * 0.99) - 1)],
+            }
+        return result
+
+    def report_lines(self):
+        lines = [f"{phase}: min {s['min']:.2f} mean {s['mean']:.2f} p95 {s['p95']:.2f} p99 {s['p99']:.2f} ms"
+                 for phase, s in self.stats().items()]
+        lines.append("waves: " + " ".join(str(count) for count in self.wave_counts))
+        return lines
+
+    # Оверлей включает замеры только на время показа: при выключении enabled возвращается
+    # к значению до включения (например, к заданному через --profile)
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled_before_overlay = self.enabled
+            self.enabled = True
+            self.overlay_lines = self.report_lines()
+        else:
+            self.enabled = self.enabled_before_overlay
+
+    def draw_overlay(self, screen, font):
+        atlas = ResourceManager().get_glyph_atlas(font, (0, 0, 0))
+        # size() достраивает атлас недостающими глифами до расчёта y: новые глифы могут увеличить его высоту
+        sizes = [atlas.size(line) for line in self.overlay_lines]
+        rects = []
+        y = HEIGHT - 10 - len(self.overlay_lines) * atlas.height
+        for line, (width, _) in zip(self.overlay_lines, sizes):
+            atlas.draw(screen, line, (10, y))
+            rects.append(pygame.Rect(10, y, width, atlas.height))
+            y += atlas.height
+        return rects
+
+    def dump(self, path):
+        with open(path, 'w') as file:
+            json.dump({
+                'frames': self.frames,
+                'window': min(self.frames, self.depth),
+                'phases_ms': self.stats(),
+                'wave_counts': self.wave_counts,
+            }, file, indent=2)
+
+
+# Рендерер грязных прямоугольников: фон восстанавливается только под границами прошлого кадра,
+# кадр рисуется поверх, на дисплей уходят только прошлые и новые границы.
+# Состояния без draw_scene и кадры с большой площадью изменений выводятся полным flip
+class DirtyRectRenderer:
+    def __init__(self, screen, background_color=BACKGROUND_COLOR, full_flip_ratio=DIRTY_RECT_FULL_FLIP_RATIO):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(background_color)
+        self.full_flip_area = full_flip_ratio * screen.get_width() * screen.get_height()
+        self.previous_rects = None
+        self.full_flips = 0
+        self.partial_updates = 0
+
+    def invalidate(self):
+        self.previous_rects = None
+
+    def present(self, facade):
+        start = perf_counter()
+        dirty = self._draw(facade)
+        drawn = perf_counter()
+        if dirty is None:
+            pygame.display.flip()
+            self.full_flips += 1
+        else:
+            pygame.display.update(dirty)
+            self.partial_updates += 1
+        if facade.profiler.enabled:
+            facade.profiler.add('draw', drawn - start)
+            facade.profiler.add('flip', perf_counter() - drawn)
+
+    # Рисует кадр и возвращает список изменённых областей или None, если нужен полный flip
+    def _draw(self, facade):
+        screen = self.screen
+        draw_scene = getattr(facade.current_state, 'draw_scene', None)
+        if draw_scene is None:
+            facade.draw(screen)
+            self.previous_rects = None
+            return None
+        if self.previous_rects is None:
+            screen.blit(self.background, (0, 0))
+            self.previous_rects = draw_scene(facade, screen)
+            return None
+        for rect in self.previous_rects:
+            screen.blit(self.background, rect, rect)
+        rects = draw_scene(facade, screen)
+        dirty = self.previous_rects + rects
+        self.previous_rects = rects
+        if sum(rect.width * rect.height for rect in dirty) > self.full_flip_area:
+            return None
+        return dirty
+
 
 # Основной игровой цикл
-def main():
-    engine = GameEngineFacade()
+def main(dirty_rects=False, profile_path=None, record_path=None, seed=None, batch_collisions=False,
+         entity_store=False):
+    # Запись требует seed: без него партию нельзя воспроизвести. InputRecorder проверяет seed до открытия окна
+    if record_path is not None and seed is None:
+        seed = random.randrange(2 ** 63)
+    recorder = InputRecorder(seed) if record_path is not None else None
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Cowboy Shooter")
+    engine = GameEngineFacade(seed=seed, batch_collisions=batch_collisions, entity_store=entity_store)
+    engine.recorder = recorder
+    engine.resource_manager.convert_for_display()
+    renderer = DirtyRectRenderer(screen) if dirty_rects else None
+    # С profile_path профилирование включено с первого кадра, отчёт пишется при выходе
+    profiler = engine.profiler
+    profiler.enabled = profile_path is not None
+    # Цикл с фиксированным шагом: накопленное время расходуется целыми тиками симуляции,
+    # остаток задаёт интерполяцию при отрисовке. Отставание сверх MAX_CATCH_UP_TICKS
+    # отбрасывается, чтобы медленные кадры не уводили цикл в догоняющую спираль
+    tick_ms = 1000 / TICK_RATE
+    accumulator = tick_ms
     running = True
     while running:
+        start = perf_counter()
         running = engine.handle_events()
-        engine.update()
-        engine.draw(screen)
-        pygame.display.flip()
-        clock.tick(FPS)
+        if profiler.enabled:
+            profiler.add('input', perf_counter() - start)
+        while accumulator >= tick_ms:
+            engine.snapshot_positions()
+            engine.update()
+            accumulator -= tick_ms
+        engine.render_alpha = accumulator / tick_ms
+        if renderer is not None:
+            renderer.present(engine)
+        else:
+            start = perf_counter()
+            engine.draw(screen)
+            drawn = perf_counter()
+            pygame.display.flip()
+            if profiler.enabled:
+                profiler.add('draw', drawn - start)
+                profiler.add('flip', perf_counter() - drawn)
+        if profiler.enabled:
+            profiler.end_frame(engine.game_state)
+        accumulator = min(accumulator + clock.tick(FPS), tick_ms * MAX_CATCH_UP_TICKS)
+    if profile_path is not None:
+        profiler.dump(profile_path)
+    if record_path is not None:
+        engine.recorder.replay.save(record_path)
     pygame.quit()
 
 
+# Воспроизведение записанной партии без окна на максимальной скорости.
+# Параметры медиатора должны совпадать с теми, с которыми партия записывалась
+def replay_main(path, batch_collisions=False, entity_store=False):
+    replay = Replay.load(path)
+    keyboard = ReplayKeyboard(replay)
+    engine = GameEngineFacade(headless=True, seed=replay.seed, keyboard=keyboard,
+                              batch_collisions=batch_collisions, entity_store=entity_store)
+    start = perf_counter()
+    ticks = engine.play_replay()
+    elapsed = perf_counter() - start
+    print(f"replayed {ticks} of {len(replay)} ticks in {elapsed:.2f} s ({ticks / max(elapsed, 1e-9):.0f} ticks/s), "
+          f"pauses {keyboard.pauses}, score {engine.game_state['score']}, hp {engine.game_state['cowboy'].hp}")
+    pygame.quit()
+
+
+def option(name):
+    return next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith(f"--{name}=")), None)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    batch_collisions = "--batch-collisions" in sys.argv
+    entity_store = "--entity-store" in sys.argv
+    if option("replay") is not None:
+        replay_main(option("replay"), batch_collisions=batch_collisions, entity_store=entity_store)
+    else:
+        seed_option = option("seed")
+        main(dirty_rects="--dirty-rects" in sys.argv, profile_path=option("profile"),
+             record_path=option("record"), seed=int(seed_option) if seed_option is not None else None,
+             batch_collisions=batch_collisions, entity_store=entity_store)
\ No newline at end of file
@@ -0,0 +1,39 @@
+# Микробенчмарк стоимости одного blit на экран: текстуры в формате загрузки PNG
+# против подповерхностей атласа, переведённого в формат дисплея (convert_alpha).
+# Запуск из корня репозитория: python benchmarks/bench_blits.py
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+NUMBER = 20000
+# Размеры, в которых текстуры рисуются в игре
+SIZES = {'cowboy': None, 'bandit': None, 'eagle': None, 'booster': (16, 16), 'hp': (40, 20)}
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((Game3.WIDTH, Game3.HEIGHT))
+    resource_manager = Game3.ResourceManager.get_instance()
+    resource_manager.convert_for_display()
+    print(f"{'texture':>8} {'raw, us':>8} {'atlas, us':>10} {'speedup':>8}")
+    for name, size in SIZES.items():
+        raw = resource_manager.images[name]
+        if size is not None:
+            raw = pygame.transform.scale(raw, size)
+        converted = resource_manager.get_texture(name, size)
+        raw_time = timeit.timeit(lambda: screen.blit(raw, (100, 100)), number=NUMBER) / NUMBER * 1e6
+        atlas_time = timeit.timeit(lambda: screen.blit(converted, (100, 100)), number=NUMBER) / NUMBER * 1e6
+        print(f"{name:>8} {raw_time:>8.2f} {atlas_time:>10.2f} {raw_time / atlas_time:>7.1f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
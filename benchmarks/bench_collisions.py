@@ -0,0 +1,81 @@
+# Бенчмарк столкновений: время кадра (update_objects + handle_collisions) при 50, 500 и 5000
+# живых сущностях для полного перебора, SpatialHash, адаптивного выбора индекса по числу сущностей
+# (поведение по умолчанию) и пакетного ядра NumPy (batch_collisions).
+# Запуск из корня репозитория: python benchmarks/bench_collisions.py
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+ENTITY_COUNTS = (50, 500, 5000)
+TICKS = 60
+BULLET_SHARE = 0.2
+
+
+def populate(facade, entity_count):
+    game_state = facade.game_state
+    bullet_count = int(entity_count * BULLET_SHARE)
+    for i in range(entity_count - bullet_count):
+        wave = game_state['waves'][i % len(game_state['waves'])]
+        if random.random() < 0.6:
+            enemy = facade.bandit_factory.create_enemy(random.randint(0, Game3.WIDTH - 32))
+        else:
+            enemy = facade.eagle_factory.create_enemy()
+        enemy.y = random.randint(0, Game3.HEIGHT - 150)
+        enemy.update_rect()
+        wave.add(enemy)
+    for _ in range(bullet_count):
+        bullet = facade.bullet_factory.create_bullet("player", random.randint(0, Game3.WIDTH),
+                                                       random.randint(0, Game3.HEIGHT))
+        game_state['cowboy'].bullets.add(bullet)
+
+
+BACKENDS = (
+    ("brute force", {'index_factory': Game3.BruteForceIndex}),
+    ("spatial hash", {'index_factory': Game3.SpatialHash}),
+    ("adaptive", {}),
+    ("numpy batch", {'batch_collisions': True}),
+)
+
+
+def measure(mediator_options, entity_count):
+    random.seed(entity_count)
+    facade = Game3.GameEngineFacade(headless=True, seed=entity_count, **mediator_options)
+    facade.step(1)
+    mediator = facade.mediator
+    populate(facade, entity_count)
+    keys = facade.keyboard.get_pressed()
+    wasd_controls = facade.wasd_input.get_controls()
+    frame_time = collision_time = 0.0
+    for _ in range(TICKS):
+        start = time.perf_counter()
+        mediator.update_objects(facade, keys, wasd_controls)
+        middle = time.perf_counter()
+        mediator.handle_collisions(facade)
+        end = time.perf_counter()
+        facade.event_bus.flush()
+        frame_time += end - start
+        collision_time += end - middle
+    return frame_time / TICKS * 1000, collision_time / TICKS * 1000, facade.game_state['score']
+
+
+def main():
+    print(f"{'entities':>8} {'backend':>14} {'frame, ms':>10} {'collisions, ms':>15} {'score':>6}")
+    for entity_count in ENTITY_COUNTS:
+        for name, mediator_options in BACKENDS:
+            if mediator_options.get('batch_collisions') and Game3.np is None:
+                continue
+            frame, collisions, score = measure(mediator_options, entity_count)
+            print(f"{entity_count:>8} {name:>14} {frame:>10.3f} {collisions:>15.3f} {score:>6}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
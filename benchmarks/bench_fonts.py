@@ -0,0 +1,47 @@
+# Время запуска (создание GameEngineFacade) и смены состояний игры с реестром шрифтов
+# ResourceManager.get_font и без него (реестр очищается перед каждой операцией, как при прямом SysFont).
+# Запуск из корня репозитория: python benchmarks/bench_fonts.py
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+TRANSITIONS = 200
+
+
+def timed(action, cold):
+    resource_manager = Game3.ResourceManager.get_instance()
+    if cold:
+        resource_manager.fonts.clear()
+    start = time.perf_counter()
+    action()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    facade = Game3.GameEngineFacade(headless=True)
+    facade.start_new_game()
+    operations = {
+        'startup': lambda: Game3.GameEngineFacade(headless=True),
+        'pause': Game3.PauseState,
+        'resume': Game3.PlayingState,
+        'game over': lambda: Game3.GameOverState(facade),
+        # Конструктор напрямую: add_notification берёт объекты из заранее заполненного пула и до шрифтов не доходит
+        'notification': lambda: Game3.Notification("Health: 2", 0, 0, 60, (255, 0, 0)),
+    }
+    print(f"{'operation':>12} {'SysFont, ms':>12} {'registry, ms':>13}")
+    for name, action in operations.items():
+        cold = sum(timed(action, True) for _ in range(TRANSITIONS)) / TRANSITIONS
+        warm = sum(timed(action, False) for _ in range(TRANSITIONS)) / TRANSITIONS
+        print(f"{name:>12} {cold:>12.3f} {warm:>13.3f}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Бенчмарк памяти: байты на живую сущность (со __slots__ и без них) и RSS
+# за 10-минутную симулированную сессию в headless-режиме. Превышение порогов - код возврата 1.
+# Запуск из корня репозитория: python benchmarks/bench_memory.py [--quick]
+import gc
+import os
+import random
+import resource
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+INSTANCES = 2000
+SESSION_TICKS = 10 * 60 * Game3.FPS
+# Пороги, закрепляющие экономию: байты на экземпляр (CPython 3.11, с запасом) и рост RSS за сессию
+MAX_BYTES_PER_INSTANCE = {
+    'Bullet': 160, 'EagleBullet': 160, 'Bandit': 200, 'Eagle': 224, 'Booster': 176, 'Heal': 168,
+    'Notification': 144, 'MoveCommand': 96, 'ShootCommand': 80,
+}
+MAX_SESSION_RSS_GROWTH_KB = 4096
+
+
+def current_rss_kb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return None
+
+
+def bytes_per_instance(make):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = [make() for _ in range(INSTANCES)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del instances
+    return allocated / INSTANCES
+
+
+# Эквивалент без __slots__ с тем же набором атрибутов: обычный класс, экземпляру которого атрибуты
+# присваиваются в порядке иерархии (сначала поля базового класса), как это делал __init__ до оптимизации.
+# Значения (Rect и т.п.) берутся у только что созданного экземпляра со слотами, поэтому обе колонки их учитывают.
+# Исходные классы были меньше (например, у Bullet не было prev_x/prev_y/pooled/serial) - колонка
+# сравнивает текущий набор полей со слотами и без, а не с историческими классами
+def dict_equivalent(cls):
+    names = [name for klass in reversed(cls.__mro__) for name in klass.__dict__.get('__slots__', ())]
+    plain = type(cls.__name__ + "Dict", (), {})
+
+    def convert(obj):
+        copy = plain()
+        for name in names:
+            if hasattr(obj, name):
+                setattr(copy, name, getattr(obj, name))
+        return copy
+    return convert
+
+
+def entity_table():
+    cowboy = Game3.Cowboy(0, 0)
+    makers = {
+        'Bullet': lambda cls: cls(0, 0),
+        'EagleBullet': lambda cls: cls(0, 0),
+        'Bandit': lambda cls: cls(0, 0),
+        'Eagle': lambda cls: cls(0, 0),
+        'Booster': lambda cls: cls(0, 0),
+        'Heal': lambda cls: cls(0, 0),
+        'Notification': lambda cls: cls("Health: 3", 0, 0, 60),
+        'MoveCommand': lambda cls: cls(cowboy, 1, 0),
+        'ShootCommand': lambda cls: cls(cowboy),
+    }
+    failures = []
+    print(f"{'class':>14} {'slots, B':>9} {'dict, B':>8} {'saved':>6}")
+    for name, make in makers.items():
+        cls = getattr(Game3, name)
+        convert = dict_equivalent(cls)
+        slotted = bytes_per_instance(lambda: make(cls))
+        dict_based = bytes_per_instance(lambda: convert(make(cls)))
+        print(f"{name:>14} {slotted:>9.0f} {dict_based:>8.0f} {1 - slotted / dict_based:>6.0%}")
+        if slotted > MAX_BYTES_PER_INSTANCE[name]:
+            failures.append(f"{name}: {slotted:.0f} B per instance, budget {MAX_BYTES_PER_INSTANCE[name]} B")
+        if slotted >= dict_based:
+            failures.append(f"{name}: __slots__ no longer saves memory ({slotted:.0f} B vs {dict_based:.0f} B)")
+    return failures
+
+
+def session():
+    random.seed(0)
+    facade = Game3.GameEngineFacade(headless=True, seed=0)
+    facade.step(1)
+    cowboy = facade.game_state['cowboy']
+    cowboy.max_hp = cowboy.hp = SESSION_TICKS
+    rss_start = current_rss_kb()
+    patterns = (
+        {pygame.K_SPACE, pygame.K_LEFT},
+        {pygame.K_SPACE, pygame.K_RIGHT},
+        {pygame.K_SPACE, pygame.K_a, pygame.K_UP},
+        {pygame.K_SPACE, pygame.K_d, pygame.K_DOWN},
+    )
+    ticks = 0
+    minute = 60 * Game3.FPS
+    while ticks < SESSION_TICKS:
+        ticks += facade.step(Game3.FPS, patterns[(ticks // Game3.FPS) % len(patterns)])
+        if ticks % minute == 0:
+            live = sum(len(wave.children) for wave in facade.game_state['waves'])
+            print(f"minute {ticks // minute:>2}: RSS {current_rss_kb()} KiB, live enemies {live}, "
+                  f"command history {len(cowboy.command_history)}")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_end = current_rss_kb()
+    print(f"RSS at start {rss_start} KiB, at end {rss_end} KiB, peak {peak} KiB")
+    if rss_start is not None and rss_end - rss_start > MAX_SESSION_RSS_GROWTH_KB:
+        return [f"session RSS grew by {rss_end - rss_start} KiB, budget {MAX_SESSION_RSS_GROWTH_KB} KiB"]
+    return []
+
+
+def main():
+    failures = entity_table()
+    if '--quick' not in sys.argv:
+        failures += session()
+    pygame.quit()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
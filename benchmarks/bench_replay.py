@@ -0,0 +1,74 @@
+# Бенчмарк на записанной партии: запись (python Game3.py --record=session.rep) воспроизводится
+# без окна на максимальной скорости несколько раз. Печатаются тики в секунду, фазы FrameProfiler
+# и отпечаток итогового состояния; расхождение отпечатков между прогонами - ошибка детерминизма.
+# Запуск из корня репозитория: python benchmarks/bench_replay.py session.rep [--repeat 3] [--output out.json]
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+
+def fingerprint(facade):
+    game_state = facade.game_state
+    cowboy = game_state['cowboy']
+    return [
+        game_state['score'], game_state['time'], cowboy.hp, cowboy.x, cowboy.y,
+        [(enemy.x, enemy.y) for wave in game_state['waves'] for enemy in wave],
+        [(bullet.x, bullet.y) for bullet in game_state['eagle_bullets']],
+    ]
+
+
+def play(replay):
+    keyboard = Game3.ReplayKeyboard(replay)
+    facade = Game3.GameEngineFacade(headless=True, seed=replay.seed, keyboard=keyboard)
+    facade.profiler = Game3.FrameProfiler(depth=max(1, len(replay)), enabled=True)
+    start = time.perf_counter()
+    ticks = facade.play_replay()
+    elapsed = time.perf_counter() - start
+    return facade, ticks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('replay')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    replay = Game3.Replay.load(args.replay)
+    print(f"{args.replay}: seed {replay.seed}, {len(replay)} ticks, {os.path.getsize(args.replay)} bytes")
+    runs = []
+    reference = None
+    for run in range(args.repeat):
+        facade, ticks, elapsed = play(replay)
+        state = fingerprint(facade)
+        if reference is None:
+            reference = state
+        stats = facade.profiler.stats()
+        runs.append({
+            'ticks': ticks,
+            'seconds': elapsed,
+            'ticks_per_s': ticks / elapsed if elapsed > 0 else 0.0,
+            'phases_ms': {phase: stats[phase] for phase in ('input', 'update_objects', 'handle_collisions')},
+            'deterministic': state == reference,
+        })
+        print(f"run {run + 1}: {ticks} ticks, {runs[-1]['ticks_per_s']:.0f} ticks/s, "
+              f"score {facade.game_state['score']}, deterministic {state == reference}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'replay': args.replay, 'seed': replay.seed, 'ticks': len(replay), 'runs': runs}, file, indent=2)
+    pygame.quit()
+    if not all(run['deterministic'] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
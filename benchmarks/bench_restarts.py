@@ -0,0 +1,71 @@
+# Бенчмарк рестартов: 1000 партий подряд в headless-режиме. После каждой контрольной точки
+# печатаются число подписчиков шины событий, число живых ScoreObserver, стоимость одной
+# синхронной доставки enemy_defeated и объём памяти Python (tracemalloc).
+# При подписках на одну партию все величины должны оставаться постоянными: рост числа подписчиков
+# или ScoreObserver между контрольными точками либо памяти сверх MAX_TRACED_GROWTH_KB - код возврата 1.
+# Запуск из корня репозитория: python benchmarks/bench_restarts.py
+import gc
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+RESTARTS = 1000
+TICKS_PER_GAME = 30
+CHECKPOINTS = (1, 10, 100, 1000)
+NOTIFY_NUMBER = 10000
+# Допуск на шум аллокатора между контрольными точками
+MAX_TRACED_GROWTH_KB = 64
+
+
+def live_instances(cls):
+    return sum(1 for obj in gc.get_objects() if type(obj) is cls)
+
+
+def main():
+    random.seed(0)
+    facade = Game3.GameEngineFacade(headless=True, seed=0)
+    event_bus = facade.event_bus
+    tracemalloc.start()
+    print(f"{'restarts':>8} {'handlers':>9} {'score obs.':>10} {'deliver, us':>12} {'traced, KiB':>12}")
+    previous = None
+    failures = []
+    for restart in range(1, RESTARTS + 1):
+        facade.start_new_game()
+        facade.change_state(Game3.PlayingState())
+        facade.step(TICKS_PER_GAME, {pygame.K_SPACE})
+        if restart in CHECKPOINTS:
+            gc.collect()
+            traced, _ = tracemalloc.get_traced_memory()
+            deliver = timeit.timeit(lambda: event_bus._deliver("enemy_defeated", {"score_value": 10}),
+                                    number=NOTIFY_NUMBER) / NOTIFY_NUMBER * 1e6
+            handlers = event_bus.subscriber_count()
+            score_observers = live_instances(Game3.ScoreObserver)
+            print(f"{restart:>8} {handlers:>9} {score_observers:>10} {deliver:>12.2f} {traced // 1024:>12}")
+            if previous is not None:
+                if handlers > previous[0]:
+                    failures.append(f"event bus handlers grew from {previous[0]} to {handlers}")
+                if score_observers > previous[1]:
+                    failures.append(f"live ScoreObservers grew from {previous[1]} to {score_observers}")
+                if traced - previous[2] > MAX_TRACED_GROWTH_KB * 1024:
+                    failures.append(f"traced memory grew by {(traced - previous[2]) // 1024} KiB "
+                                    f"between {previous[3]} and {restart} restarts")
+            previous = (handlers, score_observers, traced, restart)
+    tracemalloc.stop()
+    pygame.quit()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
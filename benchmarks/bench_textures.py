@@ -0,0 +1,33 @@
+# Микробенчмарк стоимости clone() бустеров: с пересчётом масштаба на каждый клон
+# (как до кэша производных текстур) и с общим кэшем ResourceManager.get_texture.
+# Запуск из корня репозитория: python benchmarks/bench_textures.py
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame  # noqa: E402
+import Game3  # noqa: E402
+
+NUMBER = 5000
+
+
+def main():
+    resource_manager = Game3.ResourceManager.get_instance()
+    print(f"{'prototype':>10} {'rescale, us':>12} {'cached, us':>11} {'speedup':>8}")
+    for prototype in (Game3.Booster(0, 0), Game3.Heal(0, 0)):
+        def clone_uncached():
+            resource_manager.derived_textures.clear()
+            prototype.clone()
+
+        uncached = timeit.timeit(clone_uncached, number=NUMBER) / NUMBER * 1e6
+        cached = timeit.timeit(prototype.clone, number=NUMBER) / NUMBER * 1e6
+        print(f"{type(prototype).__name__:>10} {uncached:>12.2f} {cached:>11.2f} {uncached / cached:>7.1f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# Сравнительный бенчмарк трёх вариантов игры (Game, Game2, Game3) на детерминированных сценариях.
+# Каждый прогон (вариант x сценарий) идёт в отдельном процессе без окна (SDL_VIDEODRIVER=dummy),
+# с фиксированным seed и заданной по тикам клавиатурой. Отчёт: тиков в секунду, время фаз
+# (для Game/Game2 - весь тик, для Game3 - фазы FrameProfiler) и пиковый RSS; результаты пишутся в JSON.
+# Запуск из корня репозитория: python benchmarks/bench_variants.py [--output bench_variants.json]
+import argparse
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+VARIANTS = ("Game", "Game2", "Game3")
+SEED = 1234
+
+# ticks - длина прогона; enemies - сколько врагов положить в волны до старта;
+# spawn_every_tick - обнулять таймер спавна перед каждым тиком; max_boost - бустер на весь прогон;
+# entity_store - Game3 двигает врагов пакетно через EntityStore (при наличии NumPy)
+SCENARIOS = {
+    'idle': {'ticks': 1800, 'shoot': False},
+    'heavy_spawn': {'ticks': 1800, 'shoot': True, 'spawn_every_tick': True},
+    'max_boost': {'ticks': 1800, 'shoot': True, 'max_boost': True},
+    'enemies_1k': {'ticks': 600, 'shoot': True, 'enemies': 1000, 'entity_store': True},
+    'enemies_10k': {'ticks': 120, 'shoot': True, 'enemies': 10000, 'entity_store': True},
+}
+
+
+# Удерживаемые клавиши в виде, совместимом с результатом pygame.key.get_pressed()
+class HeldKeys:
+    def __init__(self):
+        self.keys = frozenset()
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+    def get_pressed(self):
+        return self
+
+
+def scripted_keys(pygame, scenario, tick, fps):
+    # Каждую секунду игрок меняет направление, в сценариях со стрельбой держит пробел
+    keys = {pygame.K_LEFT if (tick // fps) % 2 else pygame.K_RIGHT}
+    if scenario.get('shoot'):
+        keys.add(pygame.K_SPACE)
+    return frozenset(keys)
+
+
+# В Game3 враги проходят через LifecycleManager, иначе после отсева его счётчик live() уходит в минус
+def populate(module, facade, count):
+    game_state = facade.game_state
+    spawn = facade.lifecycle.spawn if hasattr(facade, 'lifecycle') else lambda wave, enemy: wave.add(enemy)
+    for i in range(count):
+        wave = game_state['waves'][i % len(game_state['waves'])]
+        if random.random() < 0.6:
+            enemy = facade.bandit_factory.create_enemy(random.randint(0, module.WIDTH - 32))
+        else:
+            enemy = facade.eagle_factory.create_enemy()
+        enemy.y = random.randint(0, module.HEIGHT - 150)
+        enemy.update_rect()
+        spawn(wave, enemy)
+
+
+def percentiles(samples):
+    samples = sorted(samples) or [0.0]
+    return {
+        'min': samples[0],
+        'mean': sum(samples) / len(samples),
+        'p95': samples[max(0, math.ceil(len(samples) * 0.95) - 1)],
+        'p99': samples[max(0, math.ceil(len(samples) * 0.99) - 1)],
+    }
+
+
+# Один прогон в текущем процессе; Game/Game2 читают pygame.key.get_pressed() напрямую,
+# поэтому для них клавиатура подменяется на уровне pygame.key
+def run(variant, scenario_name, ticks, seed):
+    scenario = SCENARIOS[scenario_name]
+    random.seed(seed)
+    module = importlib.import_module(variant)
+    pygame = module.pygame
+    held = HeldKeys()
+    entity_store = variant == "Game3" and bool(scenario.get('entity_store')) and module.np is not None
+    if variant == "Game3":
+        facade = module.GameEngineFacade(headless=True, seed=seed, entity_store=entity_store)
+        facade.profiler = module.FrameProfiler(depth=ticks, enabled=True)
+        facade.step(0)
+    else:
+        pygame.key.get_pressed = held.get_pressed
+        facade = module.GameEngineFacade()
+        facade.start_new_game()
+        facade.change_state(module.PlayingState())
+    game_state = facade.game_state
+    cowboy = game_state['cowboy']
+    cowboy.max_hp = cowboy.hp = 10 ** 9
+    if scenario.get('max_boost'):
+        cowboy.apply_booster(ticks * 2, cowboy.base_shoot_cooldown)
+    populate(module, facade, scenario.get('enemies', 0))
+
+    tick_times = []
+    error = None
+    done = 0
+    started = time.perf_counter()
+    try:
+        for tick in range(ticks):
+            keys = scripted_keys(pygame, scenario, tick, module.FPS)
+            if scenario.get('spawn_every_tick'):
+                game_state['spawn_timer'] = 0
+            tick_start = time.perf_counter()
+            if variant == "Game3":
+                facade.step(1, keys)
+            else:
+                held.keys = keys
+                facade.update()
+            tick_times.append((time.perf_counter() - tick_start) * 1000.0)
+            done += 1
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    seconds = time.perf_counter() - started
+
+    phases = {'tick': percentiles(tick_times)}
+    if variant == "Game3":
+        phases.update({phase: stats for phase, stats in facade.profiler.stats().items()
+                       if phase in ('input', 'update_objects', 'handle_collisions')})
+    return {
+        'variant': variant,
+        'scenario': scenario_name,
+        'seed': seed,
+        'ticks_requested': ticks,
+        'ticks': done,
+        'seconds': seconds,
+        'ticks_per_s': done / seconds if seconds > 0 else 0.0,
+        'phases_ms': phases,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'live_enemies': sum(len(wave.children) for wave in game_state['waves']),
+        'entity_store': entity_store,
+        'score': game_state['score'],
+        'error': error,
+        'valid': error is None and done == ticks,
+    }
+
+
+def run_isolated(variant, scenario_name, ticks, seed):
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run', variant, scenario_name, str(ticks), str(seed)],
+        capture_output=True, text=True)
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        return {'variant': variant, 'scenario': scenario_name, 'seed': seed, 'ticks_requested': ticks,
+                'ticks': 0, 'valid': False,
+                'error': process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "no output"}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--run', nargs=4, metavar=('VARIANT', 'SCENARIO', 'TICKS', 'SEED'))
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--tick-scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--output', default='bench_variants.json')
+    args = parser.parse_args()
+
+    if args.run:
+        variant, scenario_name, ticks, seed = args.run
+        print(json.dumps(run(variant, scenario_name, int(ticks), int(seed))))
+        return
+
+    import pygame
+    results = []
+    # Прогоны с ошибкой неполные: их времена не печатаются и не сравниваются с завершёнными
+    print(f"{'scenario':>12} {'variant':>6} {'ticks':>6} {'ticks/s':>9} {'mean, ms':>9} {'p99, ms':>8} "
+          f"{'peak RSS, KiB':>14}  error")
+    for scenario_name in args.scenarios:
+        ticks = max(1, int(SCENARIOS[scenario_name]['ticks'] * args.tick_scale))
+        for variant in args.variants:
+            result = run_isolated(variant, scenario_name, ticks, args.seed)
+            results.append(result)
+            if result['valid']:
+                tick = result['phases_ms']['tick']
+                timings = f"{result['ticks_per_s']:>9.1f} {tick['mean']:>9.3f} {tick['p99']:>8.3f}"
+            else:
+                timings = f"{'invalid':>9} {'-':>9} {'-':>8}"
+            print(f"{scenario_name:>12} {variant:>6} {result['ticks']:>6} {timings} "
+                  f"{result.get('peak_rss_kb', 0):>14}  {result['error'] or ''}")
+    with open(args.output, 'w') as file:
+        json.dump({
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'seed': args.seed,
+            'results': results,
+        }, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()